@@ -1,15 +1,49 @@
-from flask import Flask, request, render_template_string, session, jsonify
-from mapping import get_maps
-from query_handler import get_relevant_canonical_headings
-from geminiCall import query_itinerary  # your existing Gemini function
+import startup
+from flask import Flask, Response, g, request, render_template_string, session, jsonify, stream_with_context
+from werkzeug.middleware.proxy_fix import ProxyFix
+from query_handler import analyze_query, warm_up
+from geminiCall import query_itinerary, stream_itinerary, get_client, prompt_stats, check_citations
+from fast_path import fast_path
+from llm_gate import LLMBusy, gate
+from response_cache import response_cache
+from itinerary_store import itinerary_store, BookingNotFound
+from itinerary_reload import reloader
+from tracing import start_trace, server_timing
+from session_store import SESSION_BACKEND, session_interface
+from rate_limit import rate_limiter
+from booking_access import verify_link, verify_surname
+from conversation import conversations
+import metrics
+import json
+import logging
 import os
+import time
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger("itinerary.app")
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)
+# Sessions are server-side (session_store.py), the cookie is just a signed random id.
+# Every worker must share SECRET_KEY, or each one rejects the others' cookies and
+# sessions (with their verified booking) are lost whenever a request changes worker.
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    if SESSION_BACKEND == "sqlite":
+        raise RuntimeError("SESSION_BACKEND=sqlite shares sessions between workers: set SECRET_KEY")
+    logger.warning("SECRET_KEY is not set: using a random per-process key, "
+                   "sessions only survive while requests stay on this one process")
+app.secret_key = SECRET_KEY or os.urandom(24)
+app.session_interface = session_interface
+
+# Behind N reverse proxies, trust N X-Forwarded-For hops for the client IP the rate limit keys on
+PROXY_HOPS = int(os.getenv("PROXY_HOPS", "0"))
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
 
-# Load your maps
-heading_tags_map, section_map = get_maps()
-MAX_QUESTIONS = 10
+# Itinerary, spaCy and the Gemini client load on first use unless STARTUP_MODE=eager
+if startup.STARTUP_MODE == "eager":
+    warm_up()
+    get_client()
 
 # Inline HTML template for chat interface
 HTML_TEMPLATE = """
@@ -30,10 +64,20 @@ HTML_TEMPLATE = """
         button { padding: 10px; margin-top: 10px; border-radius: 5px; border: none; background-color: #4CAF50; color: white; cursor: pointer; }
         button:hover { background-color: #45a049; }
         #input-container { display: flex; gap: 5px; margin-top: 10px; }
+        #booking-container { display: flex; gap: 5px; margin-bottom: 10px; }
+        #booking-container input[type="text"] { width: auto; flex: 1; margin-top: 0; }
+        #booking-container button { margin-top: 0; }
+        .notice { color: #b00020; }
     </style>
 </head>
 <body>
     <h2>Itinerary Mini-Bot</h2>
+    {% if notice %}<p class="notice">{{ notice }}</p>{% endif %}
+    <div id="booking-container">
+        <input type="text" id="booking-id" placeholder="Booking ID"/>
+        <input type="text" id="surname" placeholder="Lead traveller surname"/>
+        <button onclick="openBooking()">Open booking</button>
+    </div>
     <div class="container">
         <div class="chat-box" id="chat-box"></div>
         <div class="cited-box" id="cited-box">
@@ -53,19 +97,39 @@ HTML_TEMPLATE = """
             div.textContent = text;
             chatBox.appendChild(div);
             chatBox.scrollTop = chatBox.scrollHeight;
+            return div;
         }
 
-        function updateCited(heading, line) {
+        function updateCited(citations) {
             const citedBox = document.getElementById('cited-box');
-            if (heading === "na" || !line) {
+            if (!citations || !citations.length) {
                 citedBox.innerHTML = "<p><em>No cited text available.</em></p>";
-            } else {
-                citedBox.innerHTML = `<p><em>Cited text from the itinerary:</em></p>
-                                      <div class="heading">${heading}</div>
-                                      <div>${line}</div>`;
+                return;
+            }
+            citedBox.innerHTML = "<p><em>Cited text from the itinerary:</em></p>";
+            for (const {heading, line} of citations) {
+                const headingDiv = document.createElement('div');
+                headingDiv.className = 'heading';
+                headingDiv.textContent = heading;
+                const lineDiv = document.createElement('div');
+                lineDiv.textContent = line;
+                citedBox.append(headingDiv, lineDiv);
             }
         }
 
+        async function openBooking() {
+            const booking_id = document.getElementById('booking-id').value.trim();
+            const surname = document.getElementById('surname').value.trim();
+            if (!booking_id || !surname) return;
+            const response = await fetch('/booking', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({booking_id, surname})
+            });
+            const data = await response.json();
+            addMessage(data.response, 'bot');
+        }
+
         async function sendQuery() {
             const queryInput = document.getElementById('query');
             const query = queryInput.value.trim();
@@ -73,15 +137,53 @@ HTML_TEMPLATE = """
             addMessage(query, 'user');
             queryInput.value = '';
 
-            const response = await fetch('/ask', {
+            const started = performance.now();
+            const response = await fetch('/ask/stream', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
                 body: JSON.stringify({query})
             });
-            const data = await response.json();
-            addMessage(data.response, 'bot');
 
-            updateCited(data.heading, data.data_line);
+            // Limit reached / empty query come back as plain JSON
+            if (!(response.headers.get('Content-Type') || '').startsWith('text/event-stream')) {
+                const data = await response.json();
+                addMessage(data.response, 'bot');
+                updateCited(data.citations);
+                return;
+            }
+
+            const botDiv = addMessage('', 'bot');
+            const chatBox = document.getElementById('chat-box');
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let firstTokenMs = null;
+
+            while (true) {
+                const {value, done} = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, {stream: true});
+
+                // SSE frames are separated by a blank line
+                let sep;
+                while ((sep = buffer.indexOf('\n\n')) !== -1) {
+                    const frame = buffer.slice(0, sep);
+                    buffer = buffer.slice(sep + 2);
+                    const event = (frame.match(/^event: (.*)$/m) || [])[1];
+                    const data = JSON.parse((frame.match(/^data: (.*)$/m) || [])[1] || '{}');
+
+                    if (event === 'token') {
+                        if (firstTokenMs === null) firstTokenMs = performance.now() - started;
+                        botDiv.textContent += data.text;
+                        chatBox.scrollTop = chatBox.scrollHeight;
+                    } else if (event === 'done') {
+                        botDiv.textContent = data.response;
+                        updateCited(data.citations);
+                        console.log(`ttft ${Math.round(firstTokenMs)}ms (server ${data.ttft_ms}ms), ` +
+                                    `total ${Math.round(performance.now() - started)}ms (server ${data.total_ms}ms)`);
+                    }
+                }
+            }
         }
     </script>
 </body>
@@ -89,56 +191,265 @@ HTML_TEMPLATE = """
 """
 
 
+@app.before_request
+def begin_trace():
+    g.trace = start_trace()
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def add_server_timing(response):
+    # Per-stage timings (spacy, heading_match, prompt_build, llm, ...) for this request
+    endpoint = request.endpoint or "unknown"
+    metrics.requests_total.inc(1, endpoint, response.status_code)
+    trace = getattr(g, "trace", None)
+    if trace is not None and not response.is_streamed:
+        trace["total"] = time.perf_counter() - g.request_start
+        response.headers["Server-Timing"] = server_timing(trace)
+        metrics.request_seconds.observe(trace["total"], endpoint)
+        metrics.log_if_slow(endpoint, trace["total"], trace, (request.get_json(silent=True) or {}).get("query", ""))
+    return response
+
+
 @app.route("/")
 def index():
-    session['question_count'] = 0
+    # Signed booking link (python booking_access.py link <id>): /?booking=<id>&token=<signature>
+    booking_id = request.args.get("booking", "").strip()
+    if booking_id:
+        if not (verify_link(booking_id, request.args.get("token", "")) and booking_exists(booking_id)):
+            return render_template_string(HTML_TEMPLATE, notice="This booking link is invalid or has expired."), 403
+        session['booking_id'] = booking_id
     return render_template_string(HTML_TEMPLATE)
 
 
+def booking_exists(booking_id: str) -> bool:
+    try:
+        return itinerary_store.get(booking_id).booking_id == booking_id
+    except BookingNotFound:
+        return False
+
+
+@app.route("/booking", methods=["POST"])
+def open_booking():
+    """Bind this session to a booking given its ID and the lead traveller's surname"""
+    # Every attempt costs a question, so surnames can't be guessed at speed
+    limited = rate_limited()
+    if limited:
+        return limited
+
+    body = request.get_json(silent=True) or {}
+    booking_id = str(body.get("booking_id", "")).strip()
+    surname = str(body.get("surname", ""))
+    try:
+        itinerary = itinerary_store.get(booking_id) if booking_id else None
+    except BookingNotFound:
+        itinerary = None
+    # Same answer for an unknown booking and a wrong surname
+    if itinerary is None or not verify_surname(itinerary, surname):
+        return jsonify({"response": "That booking ID and surname don't match any booking.",
+                        "heading": "na", "data_line": ""}), 403
+
+    session['booking_id'] = itinerary.booking_id
+    return jsonify({"response": f"Booking {itinerary.booking_id} is open. How can I help?",
+                    "heading": "na", "data_line": ""})
+
+
+def current_itinerary():
+    """
+    Itinerary for this session: the booking it verified (signed link or ID +
+    surname), else the default. Booking IDs in request bodies are ignored.
+    """
+    return itinerary_store.get(session.get('booking_id'))
+
+
+def client():
+    """(ip, sid) per-client state is keyed on; sid is None until the session cookie has come back"""
+    return request.remote_addr or "unknown", session.sid if session.established else None
+
+
+def rate_limited():
+    """None if this client may ask another question, else the 429 response (question is counted)"""
+    allowed, retry_after = rate_limiter.hit(*client())
+    if allowed:
+        return None
+    response = jsonify({
+        "response": f"You've asked a lot of questions in a short time. Please try again in {int(retry_after) + 1} seconds.",
+        "heading": "na",
+        "data_line": ""
+    })
+    response.headers["Retry-After"] = str(int(retry_after) + 1)
+    return response, 429
+
+
+BOOKING_NOT_FOUND = {"response": "I couldn't find that booking — please check your booking ID or contact support",
+                     "heading": "na", "data_line": ""}
+
+
+# Views are sync: each request holds one server thread for its whole Gemini
+# call, so the WSGI server's thread count is the concurrency limit (LLM_MAX_INFLIGHT
+# and LLM_MAX_QUEUE only bound the Gemini calls inside it). Size the pool with
+# e.g. `gunicorn -k gthread --threads 32`.
 @app.route("/ask", methods=["POST"])
 def ask():
-    if 'question_count' not in session:
-        session['question_count'] = 0
+    user_query = request.json.get("query", "").strip()
+    if not user_query:
+        return jsonify({"response": "Please enter a query.", "heading": "na", "data_line": ""})
+
+    limited = rate_limited()
+    if limited:
+        return limited
+
+    try:
+        itinerary = current_itinerary()
+    except BookingNotFound:
+        return jsonify(BOOKING_NOT_FOUND), 404
+
+    # spaCy + heading match run once here and are handed to the LLM layer
+    # (which also answers greetings/facts locally and handles "no heading matched")
+    analysis = analyze_query(user_query, itinerary)
+    # Follow-ups ("and the return?") inherit the previous turn's sections and a short history
+    ip, sid = client()
+    state = conversations.get(sid)
+    analysis, history, followup = conversations.resolve(analysis, state, itinerary)
+
+    try:
+        result = query_itinerary(user_query, analysis, history=history, skip_fast_path=followup)
+    except LLMBusy:
+        # Backpressure: too many Gemini calls in flight, don't count this question
+        rate_limiter.refund(ip, sid)
+        return jsonify({"response": "The assistant is busy right now. Please try again in a moment.",
+                        "heading": "na", "data_line": ""}), 503
+
+    conversations.record(sid, state, analysis, result)
+    return jsonify(to_response(result, itinerary.sections))
 
-    if session['question_count'] >= MAX_QUESTIONS:
-        return jsonify({
-            "response": "You have reached 10 questions. Please wait a while before asking again.",
-            "heading": "na",
-            "data_line": ""
-        })
 
+def to_response(result: dict, section_map) -> dict:
+    """
+    Turn query_itinerary's answer into the chat payload with its cited lines.
+    Citations are checked against section_map by check_citations, the same
+    validator Gemini's answers go through; heading/data_line repeat the first
+    one for clients that only show a single citation.
+    """
+    citations = [{"heading": c["heading"], "line": c["line"]} for c in check_citations(result, section_map)]
+    first = citations[0] if citations else {"heading": "na", "line": ""}
+
+    return {
+        "response": result.get("explanation", ""),
+        "heading": first["heading"],
+        "data_line": first["line"],
+        "citations": citations
+    }
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/ask/stream", methods=["POST"])
+def ask_stream():
+    """
+    Server-sent events version of /ask: 'token' events carry explanation text as
+    Gemini generates it, the final 'done' event carries the citation plus
+    time-to-first-token and total latency in ms.
+    """
     user_query = request.json.get("query", "").strip()
     if not user_query:
         return jsonify({"response": "Please enter a query.", "heading": "na", "data_line": ""})
 
-    matched_headings_set = get_relevant_canonical_headings(user_query)
-    if not matched_headings_set:
-        session['question_count'] += 1
-        return jsonify({"response": "I don’t see this in your itinerary — contact support",
-                        "heading": "na", "data_line": ""})
-
-    matched_headings_list = list(matched_headings_set)
-    matched_section_map = {h: section_map.get(h, []) for h in matched_headings_list}
-
-    result = query_itinerary(user_query)
-    session['question_count'] += 1
-
-    heading = result.get("heading", "na")
-    data_idx = result.get("data_index", -1)
-    explanation = result.get("explanation", "")
-
-    if heading == "na" or data_idx == -1:
-        data_line = ""
-        response_text = explanation
-    else:
-        data_line = matched_section_map.get(heading, [""])[data_idx]
-        response_text = f"{explanation}"
-
-    return jsonify({
-        "response": response_text,
-        "heading": heading,
-        "data_line": data_line
-    })
+    limited = rate_limited()
+    if limited:
+        return limited
+
+    try:
+        itinerary = current_itinerary()
+    except BookingNotFound:
+        return jsonify(BOOKING_NOT_FOUND), 404
+
+    analysis = analyze_query(user_query, itinerary)
+    ip, sid = client()
+    state = conversations.get(sid)
+    analysis, history, followup = conversations.resolve(analysis, state, itinerary)
+
+    def generate():
+        start = time.perf_counter()
+        first_token = None
+        for kind, payload in stream_itinerary(user_query, analysis, history=history, skip_fast_path=followup):
+            if kind == "token":
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                yield sse("token", {"text": payload})
+            else:
+                total = time.perf_counter() - start
+                if payload.get("busy"):
+                    rate_limiter.refund(ip, sid)
+                else:
+                    conversations.record(sid, state, analysis, payload)
+                done = to_response(payload, itinerary.sections)
+                done["ttft_ms"] = round((first_token or total) * 1e3, 1)
+                done["total_ms"] = round(total * 1e3, 1)
+                metrics.request_seconds.observe(total, "ask_stream")
+                metrics.log_if_slow("ask_stream", total, dict(g.trace, ttft=first_token or total), user_query)
+                logger.info("stream ttft=%.1fms total=%.1fms", done["ttft_ms"], done["total_ms"])
+                yield sse("done", done)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/cache-stats")
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+
+@app.route("/rate-limit-stats")
+def rate_limit_stats():
+    return jsonify(rate_limiter.stats())
+
+
+@app.route("/conversation-stats")
+def conversation_stats():
+    return jsonify(conversations.stats())
+
+
+@app.route("/fast-path-stats")
+def fast_path_stats():
+    return jsonify(fast_path.stats())
+
+
+@app.route("/prompt-stats")
+def prompt_size_stats():
+    stats = dict(prompt_stats)
+    if stats["requests"]:
+        stats["avg_estimated_prompt_tokens"] = round(stats["estimated_prompt_tokens"] / stats["requests"], 1)
+    return jsonify(stats)
+
+
+# Scrape-time gauges for /metrics
+metrics.Gauge("itinerary_llm_inflight", "Gemini calls in flight", lambda: gate.inflight)
+metrics.Gauge("itinerary_llm_waiting", "Requests queued for a Gemini slot", lambda: gate.waiting)
+metrics.Gauge("itinerary_response_cache_hit_rate", "Response cache hit rate",
+              lambda: response_cache.stats()["hit_rate"])
+metrics.Gauge("itinerary_response_cache_entries", "Response cache entries",
+              lambda: response_cache.stats()["entries"])
+metrics.Gauge("itinerary_worker_pid", "PID of the worker that served this scrape (metrics are per process)",
+              os.getpid)
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """
+    Prometheus text format: stage/request latency histograms, token and fallback
+    counters. This worker's numbers only, see metrics.py for multi-worker setups.
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# Pick up itinerary edits without a restart (ITINERARY_WATCH_INTERVAL=0 disables)
+reloader.start()
+
+startup.mark_ready()
+startup.log_report()
 
 
 if __name__ == "__main__":
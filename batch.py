@@ -0,0 +1,145 @@
+# ------------------------ batch.py ------------------------
+# Runs many queries at once, for offline accuracy checks and for pre-warming
+# the response cache when a new itinerary is onboarded.
+#
+#   python batch.py queries.jsonl -o results.jsonl --workers 8
+#   python batch.py queries.jsonl --booking TF-DELGOA-2025-000123 > results.jsonl
+#
+# Input lines: {"id": ..., "query": "...", "booking_id": "..."} (id and
+# booking_id optional) or a bare JSON string. Output lines, written as soon as
+# each answer is ready (so not in input order):
+#   {"id": ..., "query": "...", "booking_id": "...", "result": {...}, "attempts": n}
+# Identical normalized queries for the same booking are answered once.
+
+import argparse
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from query_handler import analyze_queries, normalize_query
+from geminiCall import query_itinerary
+from itinerary_store import itinerary_store, BookingNotFound
+
+logger = logging.getLogger("itinerary.batch")
+
+
+def read_queries(lines) -> list:
+    """Parse JSONL query records; ids default to the 1-based line number"""
+    records = []
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if isinstance(record, str):
+            record = {"query": record}
+        record.setdefault("id", lineno)
+        records.append(record)
+    return records
+
+
+def answer_with_retry(query: str, analysis, retries: int, backoff: float) -> tuple:
+    """
+    query_itinerary with exponential backoff + jitter on Gemini errors and LLMBusy.
+    Returns (result, attempts, ok).
+    """
+    for attempt in range(1, retries + 2):
+        try:
+            return query_itinerary(query, analysis, raise_errors=True), attempt, True
+        except Exception as e:
+            if attempt > retries:
+                return {"explanation": f"Error: {str(e)}", "heading": "na", "data_index": -1}, attempt, False
+            delay = backoff * 2 ** (attempt - 1) * (1 + random.random())
+            logger.warning("query %r failed (%s), retry %d in %.1fs", query, e, attempt, delay)
+            time.sleep(delay)
+
+
+def run_batch(records: list, out, booking_id: str = None, workers: int = 8, retries: int = 3,
+              backoff: float = 0.5, batch_size: int = 256) -> dict:
+    """
+    Answer query records and write one JSON line per record to `out`.
+    Returns counts: records, unique queries, errors.
+    """
+    # Group identical (booking, normalized query) pairs
+    groups = {}
+    for record in records:
+        booking = record.get("booking_id") or booking_id
+        groups.setdefault((booking, normalize_query(record["query"])), []).append(record)
+
+    by_booking = {}
+    for (booking, _), group in groups.items():
+        by_booking.setdefault(booking, []).append(group)
+
+    write_lock = threading.Lock()
+    counts = {"records": len(records), "unique": len(groups), "errors": 0}
+
+    def write(group, result, attempts):
+        with write_lock:
+            for record in group:
+                out.write(json.dumps({
+                    "id": record["id"],
+                    "query": record["query"],
+                    "booking_id": record.get("booking_id") or booking_id,
+                    "result": result,
+                    "attempts": attempts,
+                }, ensure_ascii=False) + "\n")
+            out.flush()
+
+    # spaCy over every distinct query in batches, one nlp.pipe run per booking
+    jobs = []
+    for booking, booking_groups in by_booking.items():
+        try:
+            itinerary = itinerary_store.get(booking)
+        except BookingNotFound:
+            for group in booking_groups:
+                counts["errors"] += len(group)
+                write(group, {"explanation": f"Unknown booking {booking}", "heading": "na", "data_index": -1}, 0)
+            continue
+        queries = [group[0]["query"] for group in booking_groups]
+        analyses = analyze_queries(queries, itinerary, batch_size)
+        jobs.extend(zip(booking_groups, analyses))
+
+    # Fan out LLM calls; the LLM gate still caps in-flight calls per process
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(answer_with_retry, group[0]["query"], analysis, retries, backoff): group
+            for group, analysis in jobs
+        }
+        for future in as_completed(futures):
+            result, attempts, ok = future.result()
+            if not ok:
+                counts["errors"] += len(futures[future])
+            write(futures[future], result, attempts)
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of itinerary queries")
+    parser.add_argument("input", help="JSONL file of queries ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL results file ('-' for stdout)")
+    parser.add_argument("--booking", help="booking ID for records without one (default: FILE_PATH's)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.5, help="first retry delay in seconds")
+    parser.add_argument("--batch-size", type=int, default=256, help="spaCy nlp.pipe batch size")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    with source, out:
+        records = read_queries(source)
+        start = time.perf_counter()
+        counts = run_batch(records, out, args.booking, args.workers, args.retries, args.backoff,
+                           args.batch_size)
+    counts["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(counts), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
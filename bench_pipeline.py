@@ -0,0 +1,170 @@
+# ------------------------ bench_pipeline.py ------------------------
+# End-to-end benchmark of POST /ask against a local stub LLM (stub_llm.py).
+# Replays bench_queries.txt through the Flask app in-process and reports
+# latency percentiles, throughput, a per-stage breakdown (from the
+# Server-Timing header) and process memory. With --baseline it fails (exit 1)
+# when p95 latency, a stage mean or peak RSS regresses past --threshold.
+#
+#   python bench_pipeline.py --rounds 5 --concurrency 8 --llm-latency 0.2
+#   python bench_pipeline.py --save-baseline bench_baseline.json
+#   python bench_pipeline.py --baseline bench_baseline.json --threshold 0.2
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import stub_llm
+from tracing import parse_server_timing
+
+STAGES = ["spacy", "heading_match", "fast_path", "cache", "prompt_build", "llm", "response_parse", "total"]
+
+
+def load_corpus(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def start_stub(latency: float) -> str:
+    server = stub_llm.serve(0, latency)  # port 0: any free port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run(args) -> dict:
+    # Configure the app before importing it: stub LLM, no caches unless asked for
+    os.environ["GEMINI_BASE_URL"] = start_stub(args.llm_latency)
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    os.environ.setdefault("ITINERARY_WATCH_INTERVAL", "0")
+    # Test-only override: every request comes from one IP, the question limit would throttle the run
+    os.environ["RATE_LIMIT_BACKEND"] = "off"
+    if not args.cache:
+        os.environ["RESPONSE_CACHE_BACKEND"] = "off"
+        os.environ["QUERY_CACHE_SIZE"] = "0"
+
+    import_start = time.perf_counter()
+    from app import app
+    import_ms = (time.perf_counter() - import_start) * 1e3
+    rss_after_import = rss_mb()
+
+    queries = load_corpus(args.corpus)
+    # One untimed pass loads spaCy, the itinerary and the Gemini client
+    warm = app.test_client()
+    for query in queries[:3]:
+        warm.post("/ask", json={"query": query})
+
+    workload = [q for _ in range(args.rounds) for q in queries]
+    local = threading.local()
+
+    def ask(query: str):
+        client = getattr(local, "client", None)
+        if client is None:
+            # One client (one chat session) per thread
+            client = local.client = app.test_client()
+        start = time.perf_counter()
+        response = client.post("/ask", json={"query": query})
+        elapsed = (time.perf_counter() - start) * 1e3
+        return response.status_code, elapsed, parse_server_timing(response.headers.get("Server-Timing"))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(ask, workload))
+    wall = time.perf_counter() - start
+
+    latencies = [elapsed for _, elapsed, _ in results]
+    stages = {}
+    for name in STAGES:
+        values = [timing.get(name, 0.0) for _, _, timing in results]
+        stages[name] = {"mean_ms": round(statistics.fmean(values), 3), "p95_ms": round(percentile(values, 95), 3)}
+
+    statuses = {}
+    for status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "llm_latency_s": args.llm_latency,
+        "throughput_rps": round(len(results) / wall, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies), 2),
+        },
+        "stages": stages,
+        "status": statuses,
+        "memory_mb": {"after_import": round(rss_after_import, 1), "peak": round(rss_mb(), 1)},
+        "import_ms": round(import_ms, 1),
+    }
+
+
+def regressions(report: dict, baseline: dict, threshold: float) -> list:
+    """Metrics that got worse than baseline * (1 + threshold); stage means under 0.05 ms are noise"""
+    found = []
+
+    def check(name, current, previous, floor=0.0):
+        if previous > floor and current > previous * (1 + threshold):
+            found.append(f"{name}: {previous} -> {current} (+{(current / previous - 1) * 100:.0f}%)")
+
+    for pct in ("p95", "p99"):
+        check(f"latency {pct}", report["latency_ms"][pct], baseline["latency_ms"][pct])
+    for name, values in report["stages"].items():
+        if name in baseline["stages"] and name not in ("llm", "total"):
+            check(f"stage {name}", values["mean_ms"], baseline["stages"][name]["mean_ms"], floor=0.05)
+    check("peak memory", report["memory_mb"]["peak"], baseline["memory_mb"]["peak"])
+    if report["throughput_rps"] < baseline["throughput_rps"] * (1 - threshold):
+        found.append(f"throughput: {baseline['throughput_rps']} -> {report['throughput_rps']} rps")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark POST /ask against a stub LLM")
+    parser.add_argument("--corpus", default="bench_queries.txt")
+    parser.add_argument("--rounds", type=int, default=5, help="times the corpus is replayed")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub LLM seconds per call")
+    parser.add_argument("--cache", action="store_true", help="keep query/response caches on")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression, 0.2 = 20%%")
+    parser.add_argument("--save-baseline", help="write this run's report to a file")
+    args = parser.parse_args()
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(report, json.load(f), args.threshold)
+        if found:
+            print("REGRESSIONS:\n  " + "\n  ".join(found), file=sys.stderr)
+            sys.exit(1)
+        print("no regressions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# ------------------------ bench_tag_index.py ------------------------
+# Microbenchmark: per-query heading match cost vs tag vocabulary size.
+# Compares the old nested scan (phrase in tags for every heading) with TagIndex.
+#
+#   python bench_tag_index.py
+#   python bench_tag_index.py --sizes 1000 10000 50000 --queries 2000
+
+import argparse
+import random
+import time
+from itertools import permutations
+
+from tag_index import TagIndex
+
+WORDS = [
+    "hotel", "room", "flight", "pickup", "baggage", "check", "in", "time", "boarding",
+    "pass", "tour", "cruise", "passport", "support", "policy", "driver", "voucher",
+    "airport", "lobby", "phone", "address", "cab", "child", "meeting", "point",
+]
+
+
+def synthetic_tags_map(total_tags: int, headings: int = 10, seed: int = 0) -> dict:
+    """Build a heading_tags_map with roughly total_tags unique 1-3 word tags"""
+    rng = random.Random(seed)
+    tags_map = {f"Heading {h}": [] for h in range(headings)}
+    seen = set()
+    while len(seen) < total_tags:
+        n = rng.choice((1, 2, 2, 3))
+        tag = " ".join(rng.choice(WORDS) + str(rng.randrange(total_tags)) for _ in range(n))
+        if tag not in seen:
+            seen.add(tag)
+            tags_map[f"Heading {rng.randrange(headings)}"].append(tag)
+    return tags_map
+
+
+def nested_scan(tags_map: dict, nouns: list) -> set:
+    """Original get_relevant_canonical_headings matching loop"""
+    matched = set()
+    for r in range(1, min(2, len(nouns) + 1)):
+        for perm in permutations(nouns, r):
+            phrase = " ".join(perm)
+            for heading, tags in tags_map.items():
+                if heading in matched:
+                    continue
+                if phrase in tags:
+                    matched.add(heading)
+    return matched
+
+
+def sample_queries(tags_map: dict, count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    all_tags = [t for tags in tags_map.values() for t in tags]
+    queries = []
+    for _ in range(count):
+        words = rng.choice(all_tags).split() + [rng.choice(WORDS) for _ in range(3)]
+        rng.shuffle(words)
+        queries.append(words)
+    return queries
+
+
+def time_per_query(fn, queries: list) -> float:
+    start = time.perf_counter()
+    for words in queries:
+        fn(words)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 5000, 20000, 50000])
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'tags':>8} {'build ms':>10} {'index us/q':>12} {'scan us/q':>12}")
+    for size in args.sizes:
+        tags_map = synthetic_tags_map(size)
+        queries = sample_queries(tags_map, args.queries)
+
+        start = time.perf_counter()
+        index = TagIndex(tags_map)
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        index_us = time_per_query(lambda words: index.match(words, words), queries)
+        # The nested scan is slow on big vocabularies, so only time a slice of it
+        scan_us = time_per_query(lambda words: nested_scan(tags_map, words), queries[:100])
+
+        print(f"{size:>8} {build_ms:>10.1f} {index_us:>12.2f} {scan_us:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
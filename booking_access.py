@@ -0,0 +1,65 @@
+# ------------------------ booking_access.py ------------------------
+# Decides which booking a chat session may read. Booking IDs are sequential
+# and easy to guess, so an ID alone never opens an itinerary. A session is
+# bound to a booking only after one of:
+#   - a signed booking link: /?booking=<id>&token=<HMAC of id + expiry>
+#   - the booking ID plus the lead traveller's surname (POST /booking)
+# Sessions that have not verified a booking get the default one (FILE_PATH).
+#
+#   python booking_access.py link TF-DELGOA-2025-000123       # prints a signed link path
+
+import base64
+import hashlib
+import hmac
+import os
+import time
+
+from mapping import find_lead_surname
+
+# Shared by every worker; links stop verifying when it changes
+BOOKING_LINK_SECRET = os.getenv("BOOKING_LINK_SECRET") or os.getenv("SECRET_KEY")
+BOOKING_LINK_TTL = float(os.getenv("BOOKING_LINK_TTL", str(30 * 86400)))  # seconds a link stays valid
+
+
+def _signature(booking_id: str, expires: int, secret: str) -> str:
+    mac = hmac.new(secret.encode("utf-8"), f"{booking_id}|{expires}".encode("utf-8"), hashlib.sha256)
+    return base64.urlsafe_b64encode(mac.digest()[:18]).decode("ascii")
+
+
+def sign_link(booking_id: str, ttl: float = BOOKING_LINK_TTL, secret: str = BOOKING_LINK_SECRET,
+              now: float = None) -> str:
+    """Token for a booking link: '<expiry>.<signature>'"""
+    if not secret:
+        raise RuntimeError("set BOOKING_LINK_SECRET (or SECRET_KEY) to sign booking links")
+    expires = int((time.time() if now is None else now) + ttl)
+    return f"{expires}.{_signature(booking_id, expires, secret)}"
+
+
+def verify_link(booking_id: str, token: str, secret: str = BOOKING_LINK_SECRET, now: float = None) -> bool:
+    if not secret or not token or "." not in token:
+        return False
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < (time.time() if now is None else now):
+        return False
+    return hmac.compare_digest(signature, _signature(booking_id, int(expires), secret))
+
+
+def verify_surname(itinerary, surname: str) -> bool:
+    """Case-insensitive match against the lead traveller on the booking"""
+    expected = find_lead_surname(itinerary.sections)
+    if not expected or not surname:
+        return False
+    return hmac.compare_digest(expected.casefold().encode("utf-8"), surname.strip().casefold().encode("utf-8"))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sign booking links for travellers")
+    parser.add_argument("command", choices=["link"])
+    parser.add_argument("booking_ids", nargs="+")
+    parser.add_argument("--ttl", type=float, default=BOOKING_LINK_TTL, help="seconds the link stays valid")
+    args = parser.parse_args()
+
+    for booking_id in args.booking_ids:
+        print(f"/?booking={booking_id}&token={sign_link(booking_id, args.ttl)}")
@@ -0,0 +1,268 @@
+# ------------------------ build_tags.py ------------------------
+# Build-time tag vocabulary for heading matching. Checks that heading_tags_map
+# lines up with canonical_headings, expands the hand-written tags with
+# singular/plural forms and synonyms, generates tags from the field labels of
+# sample itineraries ("Pickup Point", "Hotel Check-in Time", ...), weights every
+# phrase by how specific it is (IDF across headings) and writes the compiled
+# tag_index.json that query_handler loads at startup. The build fails when a
+# GENERATED_CHECKS query no longer reaches its heading through generated tags,
+# or a GENERATED_NEGATIVE_CHECKS query matches a heading it must not.
+#
+#   python build_tags.py extractedTextFull.txt            # writes tag_index.json
+#   python build_tags.py --check                          # key alignment only, exit 1 on problems
+#
+# Labels are used instead of free text so booking-specific values (names,
+# places, codes) never become tags.
+
+import argparse
+import math
+import re
+import sys
+
+from mapping import canonical_headings, heading_tags_map, parse_itinerary, FILE_PATH
+from query_handler import STOPWORDS, TAG_INDEX_PATH, TAG_MIN_SCORE, _crude_lemma, normalize_query, tokenize
+from fast_path import GENERIC_TERMS, extract_facts
+from tag_index import TagIndex, normalize_phrase, tags_hash
+
+# Source weights before IDF: hand-written tags are trusted most. A single tag
+# has to reach TAG_MIN_SCORE on its own, so GENERATED_WEIGHT keeps generated
+# tags shared by two headings above it (0.7 * 0.79 IDF with 10 headings)
+HAND_WEIGHT = 1.0
+SYNONYM_WEIGHT = 0.8
+GENERATED_WEIGHT = 0.7
+MAX_NGRAM = 3
+
+# Queries the hand tags miss that the sample itinerary's labels must resolve: query -> heading
+GENERATED_CHECKS = {
+    "phone number": "Hotel",
+    "which vehicle is coming": "Airport Transfers",
+    "vendor ref": "Airport Transfers",
+    "special requests": "Hotel Policies",
+    "are strollers allowed": "Airline Baggage Policy",
+    "what are the inclusions": "Activities & Vouchers",
+}
+# Queries generated tags and synonyms must not widen: query -> headings that must not match.
+# Every extra heading makes the prompt bigger.
+GENERATED_NEGATIVE_CHECKS = {
+    "can i bring a car seat": ["Airport Transfers"],
+    "booking id": ["Flights"],
+    "what is my booking number": ["Flights"],
+    "passport details for the lead traveler": ["Booking Summary"],
+    "phone number": ["Contact & Escalation", "Booking Summary"],
+}
+
+# Phrase-level synonyms, applied one substitution at a time (keys are normalized phrases)
+SYNONYMS = {
+    "flight": ["plane", "air"],
+    "hotel": ["resort", "property"],
+    "baggage": ["luggage", "bag"],
+    "luggage": ["baggage"],
+    "pickup": ["pick up", "transfer"],
+    "drop": ["drop off", "dropoff"],
+    "cab": ["taxi"],
+    "taxi": ["cab"],
+    "phone": ["telephone"],
+    "check in": ["checkin"],
+    "check out": ["checkout"],
+    "checkin": ["check in"],
+    "checkout": ["check out"],
+    "address": ["location"],
+    "voucher": ["ticket"],
+    "tour": ["excursion"],
+    "support": ["help", "helpline"],
+    "email": ["mail", "e mail"],
+    "document": ["paper"],
+    "policy": ["rule"],
+    "cruise": ["boat"],
+    "time": ["timing"],
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")  # keeps "check-in" as one word
+
+
+def check_alignment(tags_map: dict, headings: list) -> list:
+    """Problems with heading_tags_map: keys that are not canonical headings, headings without tags, repeated tags"""
+    problems = []
+    for key in tags_map:
+        if key not in headings:
+            problems.append(f"tag key {key!r} is not a canonical heading")
+    for heading in headings:
+        if not tags_map.get(heading):
+            problems.append(f"heading {heading!r} has no tags")
+    for heading, tags in tags_map.items():
+        seen = set()
+        for tag in tags:
+            phrase = normalize_phrase(tag)
+            if phrase in seen:
+                problems.append(f"{heading!r}: tag {tag!r} repeated")
+            seen.add(phrase)
+    return problems
+
+
+def shared_tags(tags_map: dict) -> dict:
+    """Hand-written phrases used under more than one heading -> those headings (informational)"""
+    owners = {}
+    for heading, tags in tags_map.items():
+        for tag in tags:
+            owners.setdefault(normalize_phrase(tag), set()).add(heading)
+    return {phrase: sorted(hs) for phrase, hs in sorted(owners.items()) if len(hs) > 1}
+
+
+def inflections(phrase: str) -> set:
+    """The phrase plus singular/plural forms of its last word ('boarding pass' -> 'boarding passes')"""
+    words = phrase.split(" ")
+    last = words[-1]
+    if not last.isalpha() or len(last) < 3 or last in STOPWORDS:
+        return {phrase}
+    if last.endswith("ies"):
+        forms = {last, last[:-3] + "y"}
+    elif last.endswith("y") and last[-2] not in "aeiou":
+        forms = {last, last[:-1] + "ies"}
+    elif last.endswith(("ss", "sh", "ch", "x")):
+        forms = {last, last + "es"}
+    elif last.endswith("s"):
+        forms = {last, _crude_lemma(last)}
+    else:
+        forms = {last, last + "s"}
+    return {" ".join(words[:-1] + [form]) for form in forms}
+
+
+def synonyms(phrase: str) -> set:
+    padded = f" {phrase} "
+    out = set()
+    for key, alternatives in SYNONYMS.items():
+        if f" {key} " in padded:
+            for alternative in alternatives:
+                out.add(padded.replace(f" {key} ", f" {alternative} ", 1).strip())
+    return out
+
+
+def label_phrases(label: str) -> set:
+    """
+    Content-word n-grams of a field label ('Hotel Check-in Time' -> 'hotel check in',
+    'check in time', ...); single words only from one-word labels ('Vehicle')
+    """
+    words = [w for w in _WORD_RE.findall(label.lower()) if not w.isdigit()]
+    phrases = set()
+    for n in range(1, MAX_NGRAM + 1):
+        for i in range(len(words) - n + 1):
+            gram = words[i:i + n]
+            # Stopwords only inside a phrase ("check in time"), never at its ends
+            if gram[0] in STOPWORDS or gram[-1] in STOPWORDS:
+                continue
+            if n == 1 and (_crude_lemma(gram[0]) in GENERIC_TERMS or len(gram[0]) < 3 or len(words) > 1):
+                continue  # one word of a longer label ("booking" of "Booking Ref") is too loose
+            phrases.add(normalize_phrase(" ".join(gram)))
+    return phrases
+
+
+def generate(tags_map: dict, section_maps: list) -> dict:
+    """phrase -> {heading: source weight} from hand tags, their variants, heading names and itinerary labels"""
+    sources = {}
+
+    def add(phrase, heading, weight):
+        phrase = normalize_phrase(phrase)
+        if phrase:
+            per_heading = sources.setdefault(phrase, {})
+            per_heading[heading] = max(per_heading.get(heading, 0.0), weight)
+
+    for heading, tags in tags_map.items():
+        for tag in list(tags) + [heading]:
+            phrase = normalize_phrase(tag)
+            for form in inflections(phrase):
+                add(form, heading, HAND_WEIGHT)
+            for alternative in synonyms(phrase):
+                for form in inflections(alternative):
+                    add(form, heading, SYNONYM_WEIGHT)
+
+    for section_map in section_maps:
+        for fact in extract_facts(section_map):
+            if fact.heading not in tags_map:
+                continue
+            for phrase in label_phrases(fact.key):
+                for form in inflections(phrase):
+                    add(form, fact.heading, GENERATED_WEIGHT)
+    return sources
+
+
+def idf_weights(sources: dict, n_headings: int) -> dict:
+    """
+    Scale source weights by a smoothed IDF across headings, 1.0 for a phrase
+    owned by one heading down to 1 / (1 + ln N) for one every heading has.
+    """
+    norm = 1 + math.log(n_headings)
+    weights = {}
+    for phrase, per_heading in sources.items():
+        idf = (1 + math.log(n_headings / len(per_heading))) / norm
+        weights[phrase] = {h: round(w * idf, 3) for h, w in per_heading.items()}
+    return weights
+
+
+def check_generated(index: TagIndex, tags_map: dict, checks: dict = GENERATED_CHECKS,
+                    negative: dict = GENERATED_NEGATIVE_CHECKS) -> list:
+    """
+    Problems with checks the built index misses or the hand tags alone already
+    answer, and with negative checks matching a heading they must not
+    """
+    hand = TagIndex(tags_map, min_score=index.min_score)
+    problems = []
+    for query, heading in checks.items():
+        keywords, _, words = tokenize(normalize_query(query))
+        if heading not in index.match(keywords, words):
+            scores = index.scores(keywords, words)
+            problems.append(f"{query!r} does not reach {heading!r} (score {scores.get(heading, 0.0):.2f})")
+        elif heading in hand.match(keywords, words):
+            problems.append(f"{query!r} reaches {heading!r} through hand tags, not generated ones")
+    for query, headings in negative.items():
+        keywords, _, words = tokenize(normalize_query(query))
+        for heading in sorted(index.match(keywords, words) & set(headings)):
+            scores = index.scores(keywords, words)
+            problems.append(f"{query!r} should not match {heading!r} (score {scores[heading]:.2f})")
+    return problems
+
+
+def build(tags_map: dict, section_maps: list) -> TagIndex:
+    sources = generate(tags_map, section_maps)
+    generated = {phrase: [h for h, weight in per_heading.items() if weight == GENERATED_WEIGHT]
+                 for phrase, per_heading in sources.items()}
+    return TagIndex(weights=idf_weights(sources, len(canonical_headings)), min_score=TAG_MIN_SCORE,
+                    source_hash=tags_hash(tags_map), generated={p: hs for p, hs in generated.items() if hs})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and compile the heading tag index")
+    parser.add_argument("itineraries", nargs="*", help="extracted itinerary text files (default: FILE_PATH)")
+    parser.add_argument("-o", "--output", default=TAG_INDEX_PATH)
+    parser.add_argument("--check", action="store_true", help="only validate heading_tags_map")
+    args = parser.parse_args()
+
+    problems = check_alignment(heading_tags_map, canonical_headings)
+    for problem in problems:
+        print(f"error: {problem}", file=sys.stderr)
+    shared = shared_tags(heading_tags_map)
+    print(f"{sum(len(t) for t in heading_tags_map.values())} hand tags, "
+          f"{len(shared)} shared by several headings", file=sys.stderr)
+    if problems:
+        sys.exit(1)
+    if args.check:
+        return
+
+    paths = args.itineraries or ([FILE_PATH] if FILE_PATH else [])
+    section_maps = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            section_maps.append(parse_itinerary(f))
+
+    index = build(heading_tags_map, section_maps)
+    problems = check_generated(index, heading_tags_map) if section_maps else []
+    for problem in problems:
+        print(f"error: {problem}", file=sys.stderr)
+    if problems:
+        sys.exit(1)
+    index.save(args.output, headings=canonical_headings, itineraries=len(section_maps))
+    print(f"wrote {args.output}: {len(index)} phrases (max {index.max_words} words) "
+          f"from {len(section_maps)} itineraries", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# ------------------------ conversation.py ------------------------
+# Per-session conversation context, so follow-ups like "and what time does it
+# return?" reach Gemini with the sections (and a short history) of the turn
+# they follow. Only the last CONTEXT_MAX_TURNS turns are kept per session and
+# the history sent is trimmed to CONTEXT_TOKEN_BUDGET; state lives in the
+# session store's backend (LRU + TTL), so total memory stays bounded too.
+# Standalone questions are sent without history and keep hitting the response cache.
+
+import json
+import os
+import re
+import time
+from dataclasses import replace
+
+from mapping import canonical_headings
+from session_store import SESSION_BACKEND, SESSION_TTL, make_backend
+
+CONTEXT_ENABLED = os.getenv("CONVERSATION_CONTEXT", "on").lower() != "off"
+CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", "4"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "200"))  # ~4 chars per token, like prompt_stats
+CONTEXT_ANSWER_CHARS = int(os.getenv("CONTEXT_ANSWER_CHARS", "200"))  # per remembered answer
+FOLLOWUP_SECONDS = float(os.getenv("CONTEXT_FOLLOWUP_SECONDS", "600"))  # older turns are not followed up
+
+# An opener makes any query lean on the last turn; referring words only count
+# for queries that matched no headings of their own ("is there wifi at this
+# hotel" is a new question, "when does it leave" is not)
+FOLLOWUP_OPENERS = ("and ", "also ", "what about ", "how about ", "then ", "same ")
+FOLLOWUP_WORDS = {"it", "its", "it's", "those", "them", "they", "same", "again"}
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def is_followup(query: str, matched_headings=()) -> bool:
+    text = query.lower().strip()
+    if text.startswith(FOLLOWUP_OPENERS):
+        return True
+    return not matched_headings and bool(FOLLOWUP_WORDS & set(_WORD_RE.findall(text)))
+
+
+def summarize(turns: list, budget: int = CONTEXT_TOKEN_BUDGET) -> list:
+    """Most recent turns, oldest first, as [{"user", "assistant"}] within ~budget tokens"""
+    history, used = [], 0
+    for turn in reversed(turns):
+        entry = {"user": turn["user"], "assistant": turn["assistant"]}
+        cost = len(json.dumps(entry, ensure_ascii=False)) // 4
+        if used + cost > budget:
+            break
+        history.append(entry)
+        used += cost
+    return history[::-1]
+
+
+def with_headings(analysis, headings: list, itinerary):
+    """Copy of a QueryAnalysis pointed at other headings of the same itinerary"""
+    sections = {h: itinerary.sections.get(h, []) for h in headings}
+    return replace(analysis, matched_headings=tuple(headings), sections=sections)
+
+
+class ConversationStore:
+    """session id -> {"booking_id", "turns": [{"user", "assistant", "headings", "at"}]}"""
+
+    def __init__(self, backend, ttl: float, max_turns: int = CONTEXT_MAX_TURNS):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.followups = 0
+
+    def get(self, sid: str) -> dict:
+        """sid is None for sessions that are not established yet: no history, nothing recorded"""
+        data = self.backend.get(sid) if CONTEXT_ENABLED and sid else None
+        return json.loads(data) if data else {"booking_id": None, "turns": []}
+
+    def resolve(self, analysis, state: dict, itinerary, now: float = None) -> tuple:
+        """
+        (analysis, history, followup) for this turn. A follow-up (see
+        is_followup) gets the last turn's headings, added to its own, and the
+        summarized history; its subject is in the previous turn, so a fact
+        looked up from its words alone may come from the wrong section. Any
+        other query comes back unchanged with history None and followup False,
+        so it has the same cache key as outside a conversation.
+        """
+        turns = state["turns"]
+        now = time.time() if now is None else now
+        if not turns or state["booking_id"] != analysis.booking_id or now - turns[-1]["at"] > FOLLOWUP_SECONDS:
+            return analysis, None, False
+
+        previous = [h for h in turns[-1]["headings"] if h in itinerary.sections]
+        if not previous:
+            return analysis, None, False
+        if not is_followup(analysis.query, analysis.matched_headings):
+            return analysis, None, False  # a new question
+
+        wanted = set(previous) | set(analysis.matched_headings)
+        headings = [h for h in canonical_headings if h in wanted]
+        self.followups += 1
+        return with_headings(analysis, headings, itinerary), summarize(turns), True
+
+    def record(self, sid: str, state: dict, analysis, result: dict):
+        """Remember a finished turn; later turns follow up on its cited headings (else the matched ones)"""
+        if not CONTEXT_ENABLED or not sid:
+            return
+        cited = [c["heading"] for c in result.get("citations") or [] if isinstance(c, dict) and c.get("heading")]
+        if not cited and result.get("heading") not in (None, "na"):
+            cited = [result["heading"]]
+        turns = [] if state["booking_id"] != analysis.booking_id else state["turns"]
+        turns = (turns + [{
+            "user": analysis.query,
+            "assistant": result.get("explanation", "")[:CONTEXT_ANSWER_CHARS],
+            "headings": list(dict.fromkeys(cited)) or list(analysis.matched_headings),
+            "at": time.time(),
+        }])[-self.max_turns:]
+        state = {"booking_id": analysis.booking_id, "turns": turns}
+        self.backend.set(sid, json.dumps(state, ensure_ascii=False), self.ttl)
+
+    def stats(self) -> dict:
+        return {"enabled": CONTEXT_ENABLED, "followups": self.followups, "sessions": len(self.backend)}
+
+
+conversations = ConversationStore(make_backend(SESSION_BACKEND, table="conversations"), SESSION_TTL)
@@ -0,0 +1,157 @@
+# ------------------------ fast_path.py ------------------------
+# Answers greetings and single-fact lookups ("hotel phone", "check-in time",
+# "booking id") straight from the itinerary, before any Gemini call.
+# Facts are the "Key: Value" pairs in section lines (lines are also split on
+# "|", e.g. "Airline: Indigo (6E 5123) | PNR: H9Q2ZK"). A query is answered
+# locally only when exactly one fact value fits it; everything else falls
+# through to the LLM.
+
+import os
+import re
+from collections import OrderedDict
+
+from query_handler import STOPWORDS
+from line_ranker import terms
+
+FAST_PATH_ENABLED = os.getenv("FAST_PATH", "on").lower() != "off"
+
+GREETINGS = {"hi", "hii", "hello", "hey", "heya", "hola", "namaste", "greetings", "yo",
+             "good morning", "good afternoon", "good evening"}
+GREETING_FILLERS = {"there", "bot", "assistant", "team", "again"}
+GREETING_ANSWER = "Hello! Welcome — how may I help you with your itinerary today?"
+
+# Query words that ask *for* a value rather than narrow down which one
+GENERIC_TERMS = {"time", "timing", "number", "no", "date", "detail", "info", "information",
+                 "what", "when", "where", "which", "whats", "tell", "details"}
+
+_KEY_RE = re.compile(r"^\s*([A-Za-z][A-Za-z &/#'()-]{0,40}?)\s*:\s*(.+?)\s*$")
+_MAX_KEY_WORDS = 5
+_FACT_CACHE_SIZE = int(os.getenv("ITINERARY_CACHE_SIZE", "256"))
+
+
+def _stem(term: str) -> str:
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        return term[:-1]
+    return term
+
+
+def content_terms(text: str) -> frozenset:
+    return frozenset(_stem(t) for t in terms(text) if t not in STOPWORDS)
+
+
+class Fact:
+    __slots__ = ("key", "value", "heading", "data_index", "key_terms")
+
+    def __init__(self, key, value, heading, data_index):
+        self.key = key
+        self.value = value
+        self.heading = heading
+        self.data_index = data_index
+        self.key_terms = content_terms(key)
+
+
+def extract_facts(sections) -> list:
+    """Every short 'Key: Value' segment of every line, with its heading and line index"""
+    facts = []
+    for heading in sections:
+        for index, line in enumerate(sections[heading]):
+            for segment in line.split("|"):
+                match = _KEY_RE.match(segment)
+                if not match:
+                    continue
+                key, value = match.group(1).strip(), match.group(2).strip()
+                if len(key.split()) > _MAX_KEY_WORDS or value.startswith("//"):
+                    continue  # URLs ("https://...") are not key/value facts
+                fact = Fact(key, value, heading, index)
+                # Keys made only of generic words ("Time", "Date/Time") can't identify a fact
+                if fact.key_terms - GENERIC_TERMS:
+                    facts.append(fact)
+    return facts
+
+
+def is_greeting(query: str) -> bool:
+    text = re.sub(r"[^a-z ]+", " ", query.lower())
+    words = text.split()
+    if not words:
+        return False
+    joined = " ".join(words)
+    for greeting in GREETINGS:
+        if joined == greeting or joined.startswith(greeting + " "):
+            rest = joined[len(greeting):].split()
+            return all(word in GREETING_FILLERS or word in GREETINGS for word in rest)
+    return False
+
+
+class FastPath:
+    """Greeting classifier + per-itinerary fact lookup, with answer-rate counters"""
+
+    def __init__(self):
+        self._facts = OrderedDict()  # (booking_id, version) -> [Fact]
+        self.queries = 0
+        self.greetings = 0
+        self.facts_answered = 0
+
+    def facts_for(self, itinerary) -> list:
+        key = (itinerary.booking_id, itinerary.version)
+        facts = self._facts.get(key)
+        if facts is None:
+            facts = extract_facts(itinerary.sections)
+            self._facts[key] = facts
+            while len(self._facts) > _FACT_CACHE_SIZE:
+                self._facts.popitem(last=False)
+        return facts
+
+    def lookup(self, query: str, itinerary):
+        """The single Fact answering the query, or None if there is none or it is ambiguous"""
+        q = content_terms(query)
+        if not q:
+            return None
+
+        best, best_size = [], 0
+        for fact in self.facts_for(itinerary):
+            if not fact.key_terms <= q:
+                continue
+            # Leftover query words must only be generic ("time", "number", ...)
+            if not (q - fact.key_terms) <= GENERIC_TERMS:
+                continue
+            size = len(fact.key_terms)
+            if size > best_size:
+                best, best_size = [fact], size
+            elif size == best_size:
+                best.append(fact)
+
+        if not best or len({f.value for f in best}) != 1:
+            return None
+        return best[0]
+
+    def answer(self, query: str, itinerary):
+        """Local answer in query_itinerary's format, or None to fall back to Gemini"""
+        self.queries += 1
+        if not FAST_PATH_ENABLED:
+            return None
+
+        if is_greeting(query):
+            self.greetings += 1
+            return {"explanation": GREETING_ANSWER, "heading": "na", "data_index": -1}
+
+        fact = self.lookup(query, itinerary)
+        if fact is None:
+            return None
+        self.facts_answered += 1
+        return {
+            "explanation": f"{fact.key}: {fact.value}",
+            "heading": fact.heading,
+            "data_index": fact.data_index,
+        }
+
+    def stats(self) -> dict:
+        answered = self.greetings + self.facts_answered
+        return {
+            "queries": self.queries,
+            "greetings": self.greetings,
+            "facts": self.facts_answered,
+            "answer_rate": round(answered / self.queries, 4) if self.queries else 0.0,
+        }
+
+
+fast_path = FastPath()
@@ -1,48 +1,73 @@
 import json
+import httpx
 from google import genai
-from query_handler import get_relevant_canonical_headings  # your query->heading function
-from mapping import get_maps
-heading_tags_map, section_map = get_maps()          # your canonical maps
+from google.genai import types
+from query_handler import analyze_query, QueryAnalysis  # your query->heading function
+from itinerary_store import itinerary_store
 from dotenv import load_dotenv
 load_dotenv()
 import os
+import startup
+from llm_gate import gate, LLMBusy, LLM_TIMEOUT
+from response_cache import response_cache
+from json_stream import ExplanationStream, find_object, salvage_explanation
+from line_ranker import select_lines
+from fast_path import fast_path
+from tracing import span
+import metrics
+import logging
+
+logger = logging.getLogger("itinerary.gemini")
 
 # Set your Gemini API key
 api_key = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
+# Point at a local stub (see stub_llm.py) for load tests, e.g. http://127.0.0.1:8765
+base_url = os.getenv("GEMINI_BASE_URL")
+_client = None
 
-def query_itinerary(user_query: str):
-    """
-    Main function to process a user query:
-    - Finds relevant headings
-    - Prepares JSON data
-    - Calls Gemini
-    - Returns JSON with explanation, heading_index, data_index
-    """
 
-    # Step 1: Get matched canonical headings
-    matched_headings_set = get_relevant_canonical_headings(user_query)
-    if not matched_headings_set:
-        return {
-            "explanation": "I don’t see this in your itinerary — contact support",
-            "heading": "na",
-            "data_index": -1
-        }
+def _new_client():
+    # LLM_TIMEOUT bounds every call, sync or streamed (HttpOptions.timeout is in ms)
+    http_options = types.HttpOptions(base_url=base_url, timeout=int(LLM_TIMEOUT * 1000))
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def get_client():
+    """Create the Gemini client on first use instead of at import"""
+    global _client
+    if _client is None:
+        with startup.timed("gemini client"):
+            _client = _new_client()
+    return _client
 
-    # Step 2: Filter section_map to only matched headings
-    matched_headings_list = list(matched_headings_set)
-    matched_section_map = {
-        h: section_map.get(h, []) for h in matched_headings_list
-    }
 
-    # Step 3: Prepare JSON input for Gemini
+TIMED_OUT = {
+    "explanation": "Sorry, that took too long to answer. Please try again.",
+    "heading": "na",
+    "data_index": -1
+}
+NOT_FOUND = {
+    "explanation": "I don’t see this in your itinerary — contact support",
+    "heading": "na",
+    "data_index": -1,
+    "citations": []
+}
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+MAX_CITATIONS = int(os.getenv("MAX_CITATIONS", "3"))  # lines cited per answer
+# Ask Gemini for schema-constrained JSON (response_schema) instead of trusting the prompt alone
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "on").lower() != "off"
+
+
+def build_prompt(user_query: str, matched_section_map: dict, history: list = None) -> str:
+    """Prompt sent to Gemini for a query, its filtered section map and, for follow-ups, recent turns"""
     json_input = {
         "query": user_query,
         "data": matched_section_map
     }
+    if history:
+        json_input["conversation"] = history
 
-    # Step 4: Build prompt for Gemini
-    prompt = f"""
+    return f"""
 You are a hotel itinerary assistant.
 
 Input JSON:
@@ -53,54 +78,350 @@ Instructions:
 - Queries can also be only greetings like hi/hello, in that case, return:
   {{
     "explanation":a generic greeting message back, welcoming how may i help you,
-    "heading": "na",
-    "data_index": -1
+    "citations": []
   }}
 - ONLY use the data in the 'data' field. No assumptions about the data are allowed.
+- If there is a 'conversation' field, it holds the previous turns (oldest first). Use it only to work out what the query refers to (e.g. "it", "that", "and the return?"), never as a source of facts.
 - Even if the query might be one word, or the question might be incomplete, try to match query to data as close as possible. You have the liberty to assume what user might have been asking if question feels incomplete.
-- Return EXACTLY a JSON object with keys:
+- Return EXACTLY a JSON object with keys, in this order:
   "explanation": human-readable chat-like explanation
-  "heading": heading used from the input 'data' keys
-  "data_index": index (0-based) of the line used from that heading, basically the line that tells most about the solving the query that can be cited.
+  "citations": list of the lines the answer is based on, most relevant first, each as
+    {{"heading": heading from the input 'data' keys, "data_index": the number key of the line under that heading}}
+- If the query asks several things (e.g. "when is my pickup and my flight"), answer all of them in the one explanation and cite one line for each part, at most {MAX_CITATIONS} citations.
 - If the answer cannot be found, and you feel the query is not at all related to the data provided or out of the scope, return:
   {{
     "explanation":"I don’t see this in your itinerary — contact support",
-    "heading": "na",
-    "data_index": -1
+    "citations": []
   }}
 - Do NOT include any extra text outside the JSON.
 """
 
+
+class InvalidAnswer(ValueError):
+    """Gemini's JSON decoded but has no usable explanation"""
+
+
+PARSE_ERRORS = (json.JSONDecodeError, InvalidAnswer)
+
+
+def answer_schema(headings) -> types.Schema:
+    """Response schema for constrained JSON output; citation headings are limited to the keys sent"""
+    S, T = types.Schema, types.Type
+    heading = S(type=T.STRING, enum=list(headings)) if headings else S(type=T.STRING)
+    citation = S(type=T.OBJECT, properties={"heading": heading, "data_index": S(type=T.INTEGER)},
+                 required=["heading", "data_index"], property_ordering=["heading", "data_index"])
+    return S(
+        type=T.OBJECT,
+        properties={"explanation": S(type=T.STRING), "citations": S(type=T.ARRAY, items=citation)},
+        required=["explanation", "citations"],
+        # explanation first, stream_itinerary shows it while the citations are still coming
+        property_ordering=["explanation", "citations"],
+    )
+
+
+def generation_config(sent: dict):
+    if not STRUCTURED_OUTPUT:
+        return None
+    return types.GenerateContentConfig(response_mime_type="application/json", response_schema=answer_schema(sent))
+
+
+def parse_response_text(text: str, sent: dict = None) -> dict:
+    """
+    Decode Gemini's answer. Fences or prose around the JSON and a tail cut off
+    after the explanation are tolerated; with `sent` (the prompt's heading ->
+    {line key: line} data) citations are checked against what was sent.
+    Raises a PARSE_ERRORS exception when nothing usable is left.
+    """
+    with span("response_parse"):
+        result, outcome = _parse_response_text(text)
+        metrics.llm_responses.inc(1, outcome)
+        return validate_answer(result, sent)
+
+
+def _parse_response_text(text: str) -> tuple:
+    """(answer, outcome): outcome is exact, recovered (dug out of noise) or salvaged (truncated)"""
+    try:
+        result, exact = find_object(text)
+        outcome = "exact" if exact else "recovered"
+    except json.JSONDecodeError:
+        explanation = salvage_explanation(text)
+        if explanation is None:
+            raise
+        result, outcome = {"explanation": explanation, "citations": []}, "salvaged"
+
+    if not isinstance(result.get("explanation"), str) or not result["explanation"].strip():
+        raise InvalidAnswer("answer has no explanation")
+    return result, outcome
+
+
+def validate_answer(result: dict, sent: dict = None) -> dict:
+    """
+    Keep the citations check_citations accepts against the lines sent in the
+    prompt (all well-formed ones when `sent` is None). The first one is
+    mirrored into heading/data_index for older callers (batch output, cached answers).
+    """
+    citations = [{"heading": c["heading"], "data_index": c["data_index"]} for c in check_citations(result, sent)]
+    result["citations"] = citations
+    first = citations[0] if citations else {"heading": "na", "data_index": -1}
+    result["heading"], result["data_index"] = first["heading"], first["data_index"]
+    return result
+
+
+def _line_index(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        return int(value)
+    return None
+
+
+def _cited_line(lines, index: int):
+    """lines is a section's line list or the prompt's {line index: line}"""
+    if isinstance(lines, dict):
+        return lines.get(index)
+    if lines is not None and 0 <= index < len(lines):
+        return lines[index]
+    return None
+
+
+def check_citations(result: dict, sections=None) -> list:
+    """
+    The one citation validator, for Gemini's answer (against the lines sent)
+    and for the chat payload (against the itinerary): the answer's citations
+    as [{"heading", "data_index", "line"}]. Malformed ones, duplicates and,
+    with `sections` (heading -> lines or {line index: line}), ones pointing at
+    a heading or line that is not there are dropped; at most MAX_CITATIONS are
+    kept. Answers with only heading/data_index (fast path, older cache
+    entries) give one citation.
+    """
+    raw = result.get("citations")
+    if not isinstance(raw, list):
+        raw = [] if result.get("heading") in (None, "na") else [
+            {"heading": result.get("heading"), "data_index": result.get("data_index")}]
+
+    checked, seen = [], set()
+    for citation in raw:
+        if not isinstance(citation, dict):
+            continue
+        heading, index = citation.get("heading"), _line_index(citation.get("data_index"))
+        if index is None or not isinstance(heading, str) or (heading, index) in seen:
+            continue
+        line = None
+        if sections is not None:
+            line = _cited_line(sections.get(heading), index)
+            if line is None:
+                continue
+        seen.add((heading, index))
+        checked.append({"heading": heading, "data_index": index, "line": line})
+    if len(checked) < len(raw):
+        metrics.invalid_citations.inc(len(raw) - len(checked))
+    return checked[:MAX_CITATIONS]
+
+
+# Per-process prompt size counters (served at /prompt-stats)
+prompt_stats = {
+    "requests": 0,
+    "prompt_chars": 0,
+    "estimated_prompt_tokens": 0,   # ~4 chars per token, known before the call
+    "gemini_prompt_tokens": 0,      # usage_metadata.prompt_token_count, after the call
+    "lines_sent": 0,
+    "lines_matched": 0,
+}
+
+
+def prepare_prompt(user_query: str, analysis: QueryAnalysis, history: list = None) -> tuple:
+    """Rank section lines, keep the top ones per heading and build the prompt; returns (prompt, lines sent)"""
+    with span("prompt_build"):
+        selected = select_lines(analysis)
+        prompt = build_prompt(user_query, selected, history)
+
+    lines_sent = sum(len(lines) for lines in selected.values())
+    lines_matched = sum(len(lines) for lines in analysis.sections.values())
+    estimated = len(prompt) // 4
+    prompt_stats["requests"] += 1
+    prompt_stats["prompt_chars"] += len(prompt)
+    prompt_stats["estimated_prompt_tokens"] += estimated
+    prompt_stats["lines_sent"] += lines_sent
+    prompt_stats["lines_matched"] += lines_matched
+    logger.info("prompt: ~%d tokens, %d/%d lines from %d headings",
+                estimated, lines_sent, lines_matched, len(selected))
+    return prompt, selected
+
+
+def record_usage(usage_metadata):
+    """Add Gemini's own token counts for a finished call"""
+    if usage_metadata is None:
+        return
+    if usage_metadata.prompt_token_count:
+        prompt_stats["gemini_prompt_tokens"] += usage_metadata.prompt_token_count
+        metrics.gemini_tokens.inc(usage_metadata.prompt_token_count, "prompt")
+    if usage_metadata.candidates_token_count:
+        metrics.gemini_tokens.inc(usage_metadata.candidates_token_count, "candidates")
+
+
+def is_contact_support(result: dict) -> bool:
+    return result.get("heading") == "na" and "contact support" in result.get("explanation", "")
+
+
+def counted(result: dict, source: str) -> dict:
+    """Count an answer for /metrics by where it came from: fast_path, cache, llm, no_match, parse_error, error"""
+    metrics.answers_total.inc(1, source)
+    if is_contact_support(result):
+        metrics.contact_support.inc(1, source)
+    return result
+
+
+def parse_fallback() -> dict:
+    """Nothing usable could be parsed out of Gemini's answer"""
+    metrics.json_parse_fallbacks.inc()
+    metrics.llm_responses.inc(1, "failed")
+    return counted(dict(NOT_FOUND), "parse_error")
+
+
+def local_answer(user_query: str, analysis: QueryAnalysis, skip: bool = False):
+    """Fast-path answer (greeting or single fact), or None; skip for follow-ups of an earlier turn"""
+    if skip:
+        return None
+    with span("fast_path"):
+        return fast_path.answer(user_query, itinerary_store.get(analysis.booking_id))
+
+
+def cache_key(analysis: QueryAnalysis, history: list = None) -> str:
+    # A follow-up's answer depends on what came before it
+    return response_cache.make_key(analysis.version, analysis.matched_headings, analysis.lemmas, history)
+
+
+def answer_before_llm(user_query: str, analysis: QueryAnalysis, history: list = None,
+                      skip_fast_path: bool = False) -> tuple:
+    """
+    Steps shared by query_itinerary and stream_itinerary before Gemini is
+    called: (result, cache key). result is the counted fast-path, no-match or
+    cached answer, or None when Gemini has to answer under that key.
+    """
+    # Greetings and single-fact lookups are answered locally
+    local = local_answer(user_query, analysis, skip_fast_path)
+    if local is not None:
+        return counted(local, "fast_path"), None
+    if not analysis.matched_headings:
+        return counted(dict(NOT_FOUND), "no_match"), None
+
+    # Same itinerary, headings and query lemmas -> reuse the earlier answer
+    key = cache_key(analysis, history)
+    with span("cache"):
+        cached = response_cache.get(key)
+    if cached is not None:
+        return counted(cached, "cache"), key
+    return None, key
+
+
+def failed_answer(error: Exception) -> dict:
+    """Answer for a Gemini call that failed or could not be parsed (LLMBusy is left to the caller)"""
+    if isinstance(error, PARSE_ERRORS):
+        return parse_fallback()
+    if isinstance(error, httpx.TimeoutException):
+        return counted(dict(TIMED_OUT), "error")
+    return counted({
+        "explanation": f"Error: {str(error)}",
+        "heading": "na",
+        "data_index": -1
+    }, "error")
+
+
+def query_itinerary(user_query: str, analysis: QueryAnalysis = None, booking_id: str = None,
+                    raise_errors: bool = False, history: list = None, skip_fast_path: bool = False):
+    """
+    Main function to process a user query:
+    - Finds relevant headings in the booking's itinerary (or reuses a precomputed QueryAnalysis)
+    - Prepares JSON data
+    - Calls Gemini
+    - Returns JSON with explanation, heading_index, data_index
+    With raise_errors, Gemini/API errors propagate instead of becoming an "Error: ..." answer
+    (batch.py uses this to retry). skip_fast_path sends follow-ups ("and the phone
+    number?") to Gemini with their history instead of a fact matched on their words alone.
+    """
+
+    # Step 1: Get matched canonical headings
+    if analysis is None:
+        analysis = analyze_query(user_query, itinerary_store.get(booking_id))
+
+    result, key = answer_before_llm(user_query, analysis, history, skip_fast_path)
+    if result is not None:
+        return result
+
+    # Step 2-4: Section map already filtered to the matched headings, build prompt
+    prompt, sent = prepare_prompt(user_query, analysis, history)
+
     # Step 5: Call Gemini
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
-        )
+        with span("llm"), gate.slot():
+            response = get_client().models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=generation_config(sent)
+            )
+        record_usage(response.usage_metadata)
+        result = parse_response_text(response.text, sent)
+        response_cache.put(key, result)
+        return counted(result, "llm")
+
+    except LLMBusy:
+        raise
+    except Exception as e:
+        if raise_errors and not isinstance(e, PARSE_ERRORS):
+            raise
+        return failed_answer(e)
 
-        text = response.text.strip()
 
-        if text.startswith("'''json[") and text.endswith("]'''"):
-            text = text[len("'''json"):-3].strip()
-        elif text.startswith("```json") and text.endswith("```"):
-            text = "\n".join(text.splitlines()[1:-1]).strip()
-        elif text.startswith("```") and text.endswith("```"):
-            text = "\n".join(text.splitlines()[1:-1]).strip()
+def stream_itinerary(user_query: str, analysis: QueryAnalysis = None, booking_id: str = None,
+                     history: list = None, skip_fast_path: bool = False):
+    """
+    Streaming variant of query_itinerary. Yields ("token", text) events as the
+    explanation arrives from Gemini, then one ("done", result) event with the
+    same dict query_itinerary would return (result["busy"] is set on LLMBusy).
+    """
+    if analysis is None:
+        analysis = analyze_query(user_query, itinerary_store.get(booking_id))
 
-        return json.loads(text)
+    result, key = answer_before_llm(user_query, analysis, history, skip_fast_path)
+    if result is not None:
+        yield "token", result.get("explanation", "")
+        yield "done", result
+        return
 
-    except json.JSONDecodeError:
-        return {
-            "explanation": "I don’t see this in your itinerary — contact support",
+    prompt, sent = prepare_prompt(user_query, analysis, history)
+    stream = ExplanationStream()
+    streamed = False
+    usage = None
+
+    try:
+        with span("llm"), gate.slot():
+            for chunk in get_client().models.generate_content_stream(model=GEMINI_MODEL, contents=prompt,
+                                                                     config=generation_config(sent)):
+                usage = chunk.usage_metadata or usage
+                text = stream.feed(chunk.text or "")
+                if text:
+                    streamed = True
+                    yield "token", text
+        record_usage(usage)
+        result = counted(parse_response_text(stream.text, sent), "llm")
+        response_cache.put(key, result)
+
+    except LLMBusy:
+        result = {
+            "explanation": "The assistant is busy right now. Please try again in a moment.",
             "heading": "na",
-            "data_index": -1
+            "data_index": -1,
+            "busy": True
         }
     except Exception as e:
-        return {
-            "explanation": f"Error: {str(e)}",
-            "heading": "na",
-            "data_index": -1
-        }
+        result = failed_answer(e)
+
+    # Fallback answers (or a model that ignored the key order) arrive in one piece
+    if not streamed:
+        yield "token", result.get("explanation", "")
+    yield "done", result
 
 
 # ------------------------------
@@ -125,6 +446,7 @@ if __name__ == "__main__":
             print("Data index: -1 (no match)")
         else:
             # Use indices in the filtered matched_section_map
+            section_map = itinerary_store.get().sections
             data_line = section_map[heading][data_idx]
 
             print(f"Heading : ({heading})")
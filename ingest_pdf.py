@@ -0,0 +1,266 @@
+# ------------------------ ingest_pdf.py ------------------------
+# Turns itinerary PDFs into section maps / .itn files with no manual step.
+# Each page's text layer is used when it has one (PyMuPDF); image-only pages
+# are rendered and OCR'd locally (pytesseract). Canonical headings are found
+# with fuzzy matching, since PDF and OCR text rarely reproduce them exactly
+# ("Traveler Documents (for check-in)", "Hote1 Policies").
+# Pages of every document are spread over a process pool.
+#
+#   python ingest_pdf.py "sample itinerary pdf.pdf"                  # -> itineraries/<booking>.itn
+#   python ingest_pdf.py bookings/*.pdf --workers 8 --out itineraries
+#   python ingest_pdf.py "sample itinerary pdf.pdf" --format json    # section map JSON to stdout
+#   python ingest_pdf.py "sample itinerary pdf.pdf" --format text    # text in extractedTextFull.txt layout
+#
+# Needs `pip install pymupdf`; OCR also needs `pip install pytesseract pillow`
+# and the tesseract binary. Without them image pages are left empty. A document
+# with no recognised itinerary heading is an error like any other (exit 1), so
+# bulk runs never write empty output for it.
+
+import argparse
+import difflib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from mapping import canonical_headings, parse_itinerary, find_booking_id
+from itinerary_store import ITINERARY_DIR, BOOKING_ID_RE, compile_sections
+
+logger = logging.getLogger("itinerary.ingest")
+
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+MIN_TEXT_CHARS = int(os.getenv("PDF_MIN_TEXT_CHARS", "40"))  # less text than this -> treat as an image page
+HEADING_CUTOFF = float(os.getenv("HEADING_MATCH_CUTOFF", "0.85"))  # difflib ratio
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "4"))
+EDGE_LINES = int(os.getenv("PDF_EDGE_LINES", "3"))  # lines at the top/bottom of a page that may be headers/footers
+
+_PAREN = re.compile(r"\s*[(\[].*?[)\]]\s*")
+_NON_WORD = re.compile(r"[^a-z0-9&]+")
+_PAGE_NUMBER = re.compile(r"^(page\s*)?\d+(\s*(of|/)\s*\d+)?$", re.I)
+_MAX_HEADING_WORDS = 6
+
+
+def _heading_key(text: str) -> str:
+    """'Traveler Documents (for check-in)' -> 'traveler documents'"""
+    text = _PAREN.sub(" ", text.lower())
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+_CANONICAL_KEYS = {_heading_key(h): h for h in canonical_headings}
+
+
+class HeadingMatcher:
+    """
+    heading_of() for parse_itinerary: exact match on the normalized line, then
+    difflib. Each heading starts a section once, so running page headers that
+    repeat a heading don't cut a section short.
+    """
+
+    def __init__(self, cutoff: float = HEADING_CUTOFF):
+        self.cutoff = cutoff
+        self.seen = set()
+
+    def __call__(self, line: str):
+        if ":" in line or len(line.split()) > _MAX_HEADING_WORDS:
+            return None  # "Hotel Phone: ..." is a fact, not a heading
+        key = _heading_key(line)
+        heading = _CANONICAL_KEYS.get(key)
+        if heading is None and key:
+            close = difflib.get_close_matches(key, _CANONICAL_KEYS, n=1, cutoff=self.cutoff)
+            heading = _CANONICAL_KEYS[close[0]] if close else None
+        if heading is None or heading in self.seen:
+            return None
+        self.seen.add(heading)
+        return heading
+
+
+def _open(path: str):
+    try:
+        import pymupdf
+    except ImportError:
+        try:
+            import fitz as pymupdf  # PyMuPDF < 1.24
+        except ImportError as e:
+            raise RuntimeError("PDF ingestion needs PyMuPDF: pip install pymupdf") from e
+    return pymupdf.open(path)
+
+
+def _ocr(page) -> str:
+    try:
+        import pytesseract
+        from PIL import Image
+    except ImportError:
+        logger.warning("page %d has no text layer and pytesseract/pillow are not installed", page.number + 1)
+        return ""
+    pix = page.get_pixmap(dpi=OCR_DPI)
+    mode = "RGBA" if pix.alpha else "RGB"
+    image = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+    try:
+        return pytesseract.image_to_string(image, lang=OCR_LANG)
+    except pytesseract.TesseractNotFoundError:
+        logger.warning("page %d has no text layer and the tesseract binary is not installed", page.number + 1)
+        return ""
+
+
+def extract_pages(path: str, start: int, stop: int) -> list:
+    """[(page number, text, "text" | "ocr")] for pages start..stop-1; runs in a worker process"""
+    pages = []
+    with _open(path) as doc:
+        for number in range(start, min(stop, doc.page_count)):
+            page = doc[number]
+            text = page.get_text("text")
+            source = "text"
+            if len(text.strip()) < MIN_TEXT_CHARS:
+                text, source = _ocr(page), "ocr"
+            pages.append((number, text, source))
+    return pages
+
+
+def page_count(path: str) -> int:
+    with _open(path) as doc:
+        return doc.page_count
+
+
+def _edge_positions(count: int, edge: int = EDGE_LINES) -> list:
+    """Position key per line of a page: ("top", i) / ("bottom", i) near the edges, None in the body"""
+    positions = [None] * count
+    for i in range(min(edge, count)):
+        positions[count - 1 - i] = ("bottom", i)
+    for i in range(min(edge, count)):
+        positions[i] = ("top", i)
+    return positions
+
+
+def text_lines(pages: list) -> list:
+    """
+    Page texts in order as lines, without blank lines, bare page numbers and
+    running headers/footers: a line in the first/last EDGE_LINES of a page
+    that sits at the same position with the same text on more than half of
+    3+ pages. The same text in a page body ("Vehicle: AC Sedan") is kept.
+    """
+    per_page = []
+    for _, text, _ in sorted(pages):
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        per_page.append([line for line in lines if not _PAGE_NUMBER.match(line)])
+
+    positions = [_edge_positions(len(page_lines)) for page_lines in per_page]
+    running = set()
+    if len(per_page) >= 3:
+        counts = {}
+        for page_lines, page_positions in zip(per_page, positions):
+            for key in {(p, line) for p, line in zip(page_positions, page_lines) if p is not None}:
+                counts[key] = counts.get(key, 0) + 1
+        running = {key for key, count in counts.items() if count > len(per_page) / 2}
+
+    return [line for page_lines, page_positions in zip(per_page, positions)
+            for p, line in zip(page_positions, page_lines)
+            if p is None or (p, line) not in running]
+
+
+class NoSections(ValueError):
+    """No canonical heading with any line under it was found in a document"""
+
+
+def sections_from_pages(pages: list) -> dict:
+    """Section map of one document's pages; raises NoSections when nothing was recognised"""
+    section_map = parse_itinerary(text_lines(pages), heading_of=HeadingMatcher())
+    if not any(section_map.values()):
+        blank = sum(1 for _, text, source in pages if source == "ocr" and not text.strip())
+        hint = f", {blank} image pages gave no OCR text (is tesseract installed?)" if blank else ""
+        raise NoSections(f"no itinerary sections found in {len(pages)} pages{hint}")
+    return section_map
+
+
+def ingest(path: str) -> dict:
+    """Section map of one PDF, in this process"""
+    return sections_from_pages(extract_pages(path, 0, page_count(path)))
+
+
+def ingest_many(paths: list, workers: int = None) -> dict:
+    """
+    path -> section map (or the exception that document raised, NoSections
+    when no itinerary heading was recognised) for many PDFs.
+    Every document is cut into PAGES_PER_TASK-page tasks so long and OCR-heavy
+    documents spread over the pool too.
+    """
+    results, tasks = {}, []
+    for path in paths:
+        try:
+            count = page_count(path)
+        except Exception as e:
+            results[path] = e
+            continue
+        tasks.extend((path, start, start + PAGES_PER_TASK) for start in range(0, count, PAGES_PER_TASK))
+
+    pages = {path: [] for path in paths if path not in results}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(path, pool.submit(extract_pages, path, start, stop)) for path, start, stop in tasks]
+        for path, future in futures:
+            if path in results:
+                continue  # an earlier chunk of this document failed
+            try:
+                pages[path].extend(future.result())
+            except Exception as e:
+                results[path] = e
+
+    for path, doc_pages in pages.items():
+        if path not in results:
+            try:
+                results[path] = sections_from_pages(doc_pages)
+            except NoSections as e:
+                results[path] = e
+    return results
+
+
+def as_text(section_map: dict) -> str:
+    """Section map in the extractedTextFull.txt layout (heading line, then its lines)"""
+    return "".join(f"{heading}\n" + "".join(f"{line}\n" for line in lines) for heading, lines in section_map.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest itinerary PDFs into section maps / .itn files")
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--format", choices=["itn", "json", "text"], default="itn")
+    parser.add_argument("--out", default=ITINERARY_DIR, help="directory for .itn files")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    start = time.perf_counter()
+    results = ingest_many(args.pdfs, args.workers)
+    errors = 0
+
+    for path in args.pdfs:
+        section_map = results[path]
+        if isinstance(section_map, Exception):
+            errors += 1
+            logger.error("%s: %s", path, section_map)
+            continue
+        missing = [h for h in canonical_headings if h not in section_map]
+        if missing:
+            logger.warning("%s: no %s section found", path, ", ".join(missing))
+
+        if args.format == "json":
+            print(json.dumps({"source": path, "sections": section_map}, ensure_ascii=False))
+        elif args.format == "text":
+            sys.stdout.write(as_text(section_map))
+        else:
+            booking_id = find_booking_id(section_map)
+            if not booking_id or not BOOKING_ID_RE.match(booking_id):
+                errors += 1
+                logger.error("%s: no usable 'Booking ID:' line", path)
+                continue
+            os.makedirs(args.out, exist_ok=True)
+            compile_sections(section_map, booking_id, os.path.join(args.out, f"{booking_id}.itn"))
+            print(f"{path} -> {booking_id}")
+
+    logger.info("%d documents, %d errors, %.1fs", len(args.pdfs), errors, time.perf_counter() - start)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# ------------------------ itinerary_reload.py ------------------------
+# Picks up edits to itinerary text files without a restart. A background
+# thread polls the source file of every booking the store has compiled
+# (FILE_PATH, ITINERARY_DIR/<booking>.txt). When the mtime moves and the
+# content hash really changed, only the sections whose raw text changed are
+# re-parsed, and the store swaps in the recompiled itinerary. Watching starts
+# from the mtime/hash recorded when the store compiled the file, so an edit
+# made between that compile and the first poll is not lost. Each swap bumps
+# the itinerary's revision and changes its content version, which is what the
+# response cache keys on.
+
+import hashlib
+import logging
+import os
+import threading
+
+from mapping import canonical_headings
+from itinerary_store import itinerary_store
+
+ITINERARY_WATCH_INTERVAL = float(os.getenv("ITINERARY_WATCH_INTERVAL", "2"))  # seconds, 0 = off
+
+logger = logging.getLogger("itinerary.reload")
+
+
+def split_raw_sections(lines) -> dict:
+    """Group raw lines under canonical headings, same boundaries as parse_itinerary"""
+    chunks = {}
+    current = None
+    for line in lines:
+        stripped = line.strip()
+        if stripped in canonical_headings:
+            current = stripped
+            chunks[current] = []
+        elif current is not None:
+            chunks[current].append(line)
+    return chunks
+
+
+def _chunk_hash(raw_lines: list) -> str:
+    return hashlib.sha1("".join(raw_lines).encode("utf-8")).hexdigest()
+
+
+class SourceState:
+    """What we last loaded from one source file"""
+
+    def __init__(self, path: str, stamp: dict = None):
+        self.path = path
+        # The compile's {"mtime_ns", "sha1"}; None (no stamp) reloads on the first poll
+        self.mtime = stamp["mtime_ns"] if stamp else None
+        self.digest = stamp["sha1"] if stamp else None
+        self.chunk_hashes = {}   # heading -> hash of its raw lines, empty until the first reload
+        self.section_map = {}    # heading -> parsed lines
+
+
+class ItineraryReloader:
+    def __init__(self, store=itinerary_store, interval: float = ITINERARY_WATCH_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self.states = {}  # booking ID -> SourceState
+        self.reloads = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check_once(self) -> list:
+        """Reload every changed source; returns the booking IDs that were swapped"""
+        reloaded = []
+        stamps = self.store.source_stamps
+        for booking_id, path in list(self.store.sources.items()):
+            if booking_id not in stamps:
+                continue  # registered but not compiled/opened yet
+            state = self.states.get(booking_id)
+            if state is None or state.path != path:
+                state = self.states[booking_id] = SourceState(path, stamps[booking_id])
+            try:
+                if self._refresh(booking_id, state):
+                    reloaded.append(booking_id)
+            except OSError as e:
+                logger.warning("reload of %s from %s failed: %s", booking_id, path, e)
+        return reloaded
+
+    def _refresh(self, booking_id: str, state: SourceState) -> bool:
+        mtime = os.stat(state.path).st_mtime_ns
+        if mtime == state.mtime:
+            return False
+
+        with open(state.path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        state.mtime = mtime
+        if digest == state.digest:
+            return False  # touched, not changed
+        state.digest = digest
+
+        # Re-parse only sections whose raw text changed
+        chunks = split_raw_sections(raw.decode("utf-8").splitlines(keepends=True))
+        section_map, changed = {}, []
+        for heading, raw_lines in chunks.items():
+            chunk_hash = _chunk_hash(raw_lines)
+            if state.chunk_hashes.get(heading) == chunk_hash:
+                section_map[heading] = state.section_map[heading]
+            else:
+                section_map[heading] = [l.strip() for l in raw_lines if l.strip()]
+                state.chunk_hashes[heading] = chunk_hash
+                changed.append(heading)
+        for heading in set(state.chunk_hashes) - set(chunks):
+            del state.chunk_hashes[heading]
+        state.section_map = section_map
+
+        itinerary = self.store.replace(booking_id, section_map, {"mtime_ns": mtime, "sha1": digest})
+        self.reloads += 1
+        logger.info("reloaded %s (revision %d, version %s), changed sections: %s",
+                    booking_id, itinerary.revision, itinerary.version, ", ".join(changed) or "none")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check_once()
+
+    def start(self):
+        """Start polling in a daemon thread (no-op when the interval is 0)"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self.check_once()
+        self._thread = threading.Thread(target=self._run, name="itinerary-reload", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+reloader = ItineraryReloader()
@@ -0,0 +1,255 @@
+# ------------------------ itinerary_store.py ------------------------
+# Serves many bookings from one process. Each itinerary text is parsed once
+# into a compact .itn file under ITINERARY_DIR:
+#
+#   b"ITN1" | uint32 header length | header JSON | UTF-8 blob
+#
+# The header maps each heading to the byte span of its lines ("\n"-joined) in
+# the blob. Files are memory-mapped and a heading is only decoded when asked
+# for, so an itinerary that is open but barely used costs almost nothing.
+# Hot itineraries stay open in an LRU of ITINERARY_CACHE_SIZE entries.
+#
+#   python itinerary_store.py compile extractedTextFull.txt other_booking.txt
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from mapping import parse_itinerary, section_map_version, find_booking_id, FILE_PATH
+
+ITINERARY_DIR = os.getenv("ITINERARY_DIR", "itineraries")
+ITINERARY_CACHE_SIZE = int(os.getenv("ITINERARY_CACHE_SIZE", "256"))
+DEFAULT_BOOKING_ID = os.getenv("DEFAULT_BOOKING_ID")
+
+MAGIC = b"ITN1"
+_HEADER_LEN = struct.Struct("<I")
+BOOKING_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+class BookingNotFound(KeyError):
+    """No compiled or source itinerary exists for the booking ID"""
+
+
+def compile_sections(section_map: dict, booking_id: str, path: str, source: dict = None):
+    """
+    Write a section map as a .itn file atomically, via a temp file of its own
+    (concurrent compiles of one booking never share one). source is the
+    {"mtime_ns", "sha1"} of the text it was parsed from, so the reloader knows
+    exactly which edit the file reflects.
+    """
+    blob = bytearray()
+    spans = {}
+    for heading, lines in section_map.items():
+        data = "\n".join(lines).encode("utf-8")
+        spans[heading] = [len(blob), len(blob) + len(data), len(lines)]
+        blob += data
+
+    header = json.dumps({
+        "booking_id": booking_id,
+        "version": section_map_version(section_map),
+        "sections": spans,
+        "source": source,
+    }, ensure_ascii=False).encode("utf-8")
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".",
+                               suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + _HEADER_LEN.pack(len(header)) + header + bytes(blob))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def compile_text(text_path: str, out_dir: str = ITINERARY_DIR, booking_id: str = None) -> str:
+    """Parse an extracted itinerary text file and compile it; returns the booking ID"""
+    # stat before reading: an edit landing mid-read leaves a newer mtime for the reloader
+    mtime = os.stat(text_path).st_mtime_ns
+    with open(text_path, "rb") as f:
+        raw = f.read()
+    section_map = parse_itinerary(raw.decode("utf-8").splitlines())
+    source = {"mtime_ns": mtime, "sha1": hashlib.sha1(raw).hexdigest()}
+
+    booking_id = booking_id or find_booking_id(section_map)
+    if not booking_id or not BOOKING_ID_RE.match(booking_id):
+        raise ValueError(f"{text_path}: no usable 'Booking ID:' line, pass booking_id explicitly")
+
+    os.makedirs(out_dir, exist_ok=True)
+    compile_sections(section_map, booking_id, os.path.join(out_dir, f"{booking_id}.itn"), source)
+    return booking_id
+
+
+class SectionView(Mapping):
+    """Read-only heading -> [lines] view over a memory-mapped blob, decoded on access"""
+
+    def __init__(self, buf, base: int, spans: dict):
+        self._buf = buf
+        self._base = base
+        self._spans = spans
+        self._decoded = {}
+
+    def __getitem__(self, heading):
+        lines = self._decoded.get(heading)
+        if lines is None:
+            start, end, count = self._spans[heading]
+            text = self._buf[self._base + start:self._base + end].decode("utf-8")
+            lines = text.split("\n") if count else []
+            self._decoded[heading] = lines
+        return lines
+
+    def __iter__(self):
+        return iter(self._spans)
+
+    def __len__(self):
+        return len(self._spans)
+
+
+class Itinerary:
+    """
+    One compiled booking: booking_id, content version (hash) and lazily decoded
+    sections. revision counts in-process reloads of the booking (1 = first load);
+    source is the stamp of the text it was compiled from (None for PDFs).
+    """
+
+    def __init__(self, path: str, revision: int = 1):
+        self.path = path
+        self.revision = revision
+        with open(path, "rb") as f:
+            # The mapping stays valid after the file is closed (and after os.replace)
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._buf[:4] != MAGIC:
+            raise ValueError(f"{path}: not a compiled itinerary")
+        (header_len,) = _HEADER_LEN.unpack_from(self._buf, 4)
+        header_end = 8 + header_len
+        header = json.loads(self._buf[8:header_end].decode("utf-8"))
+
+        self.booking_id = header["booking_id"]
+        self.version = header["version"]
+        self.source = header.get("source")
+        self.sections = SectionView(self._buf, header_end, header["sections"])
+
+
+class ItineraryStore:
+    """booking ID -> Itinerary, loading compiled files on demand with LRU eviction"""
+
+    def __init__(self, directory: str = ITINERARY_DIR, capacity: int = ITINERARY_CACHE_SIZE,
+                 default_source: str = FILE_PATH, default_booking_id: str = DEFAULT_BOOKING_ID):
+        self.directory = directory
+        self.capacity = capacity
+        self.default_source = default_source
+        self._default_booking_id = default_booking_id
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+        self._compile_locks = {}  # booking ID -> lock held while it is compiled or loaded
+        self._default_lock = threading.Lock()
+        self.sources = {}  # booking ID -> text file it was compiled from (watched for reloads)
+        self.source_stamps = {}  # booking ID -> {"mtime_ns", "sha1"} of that file when compiled
+        self.revisions = {}  # booking ID -> reload count, kept across LRU evictions
+
+    def path_for(self, booking_id: str) -> str:
+        return os.path.join(self.directory, f"{booking_id}.itn")
+
+    def _compile_lock(self, booking_id: str) -> threading.Lock:
+        """One compile at a time per booking (first get()s, reloads); other bookings go on in parallel"""
+        with self._lock:
+            lock = self._compile_locks.get(booking_id)
+            if lock is None:
+                lock = self._compile_locks[booking_id] = threading.Lock()
+            return lock
+
+    @property
+    def default_booking_id(self):
+        """Booking served when a session has not picked one: FILE_PATH's booking"""
+        if self._default_booking_id is None and self.default_source:
+            with self._default_lock:
+                if self._default_booking_id is None:
+                    booking_id = compile_text(self.default_source, self.directory)
+                    self.sources[booking_id] = self.default_source
+                    self._default_booking_id = booking_id
+        return self._default_booking_id
+
+    def get(self, booking_id: str = None) -> Itinerary:
+        booking_id = booking_id or self.default_booking_id
+        if not booking_id or not BOOKING_ID_RE.match(booking_id):
+            raise BookingNotFound(booking_id)
+
+        with self._lock:
+            itinerary = self._open.get(booking_id)
+            if itinerary is not None:
+                self._open.move_to_end(booking_id)
+                return itinerary
+
+        with self._compile_lock(booking_id):
+            with self._lock:
+                itinerary = self._open.get(booking_id)  # another thread loaded it meanwhile
+            if itinerary is None:
+                itinerary = self._load(booking_id)
+
+            with self._lock:
+                self._open[booking_id] = itinerary
+                self._open.move_to_end(booking_id)
+                # Evicted itineraries are just dropped; in-flight requests keep their reference
+                while len(self._open) > self.capacity:
+                    self._open.popitem(last=False)
+        return itinerary
+
+    def _load(self, booking_id: str) -> Itinerary:
+        path = self.path_for(booking_id)
+        # Raw text next to the compiled files (or FILE_PATH for the default booking)
+        source = self.sources.get(booking_id) or os.path.join(self.directory, f"{booking_id}.txt")
+        if os.path.exists(source):
+            # Recompile when the text was edited after the .itn was written (e.g. while we were down)
+            if not os.path.exists(path) or os.stat(source).st_mtime_ns > os.stat(path).st_mtime_ns:
+                compile_text(source, self.directory, booking_id)
+            self.sources[booking_id] = source
+        elif not os.path.exists(path):
+            raise BookingNotFound(booking_id)
+
+        itinerary = Itinerary(path, self.revisions.get(booking_id, 1))
+        if booking_id in self.sources:
+            self.source_stamps[booking_id] = itinerary.source
+        return itinerary
+
+    def replace(self, booking_id: str, section_map: dict, source: dict = None) -> Itinerary:
+        """
+        Recompile a booking from a new section map and swap it in, bumping its
+        revision. Requests that already hold the old Itinerary keep reading it
+        (its mmap stays valid after the file is replaced).
+        """
+        path = self.path_for(booking_id)
+        with self._compile_lock(booking_id):
+            compile_sections(section_map, booking_id, path, source)
+
+            with self._lock:
+                revision = self.revisions.get(booking_id, 1) + 1
+                itinerary = Itinerary(path, revision)
+                self.revisions[booking_id] = revision
+                # Only swap if it is open; evicted bookings pick up the new file on next get()
+                if booking_id in self._open:
+                    self._open[booking_id] = itinerary
+        return itinerary
+
+
+itinerary_store = ItineraryStore()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile extracted itinerary text files into .itn files")
+    parser.add_argument("command", choices=["compile"])
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--out", default=ITINERARY_DIR)
+    args = parser.parse_args()
+
+    for text_path in args.files:
+        print(f"{text_path} -> {compile_text(text_path, args.out)}")
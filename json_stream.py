@@ -0,0 +1,110 @@
+# ------------------------ json_stream.py ------------------------
+# Pulls the "explanation" string out of Gemini's JSON answer while it is still
+# streaming, so the chat can show text before the whole object has arrived.
+# find_object() / salvage_explanation() recover the answer from noisy or
+# truncated model output instead of giving up on the first JSONDecodeError.
+
+import json
+import re
+
+_EXPLANATION_START = re.compile(r'"explanation"\s*:\s*"')
+
+
+class ExplanationStream:
+    """
+    Feed raw text chunks in order; feed() returns the newly decoded part of the
+    explanation value. The full raw text is kept in .text for the final json parse.
+    """
+
+    def __init__(self, key_pattern=_EXPLANATION_START):
+        self.key_pattern = key_pattern
+        self.text = ""
+        self._pos = None   # index of the next unread char inside the string value
+        self.done = False  # closing quote seen
+
+    def feed(self, chunk: str) -> str:
+        self.text += chunk
+        if self.done:
+            return ""
+
+        if self._pos is None:
+            match = self.key_pattern.search(self.text)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        out = []
+        text, i = self.text, self._pos
+        while i < len(text):
+            ch = text[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+
+            # Escape sequence: wait for the rest of it if it was split across chunks
+            length = self._escape_length(text, i)
+            if length is None:
+                break
+            out.append(json.loads('"' + text[i:i + length] + '"'))
+            i += length
+
+        self._pos = i
+        return "".join(out)
+
+    @staticmethod
+    def _escape_length(text: str, i: int):
+        """Length of the escape starting at text[i], or None if it is incomplete"""
+        if i + 1 >= len(text):
+            return None
+        if text[i + 1] != "u":
+            return 2
+        if i + 6 > len(text):
+            return None
+        # High surrogate: decode together with the low surrogate that follows
+        if 0xD800 <= int(text[i + 2:i + 6], 16) <= 0xDBFF:
+            if i + 12 > len(text):
+                return None
+            return 12
+        return 6
+
+
+def find_object(text: str, key: str = "explanation") -> tuple:
+    """
+    The first JSON object in text that has `key`: bare, inside ``` fences or
+    after some prose. Returns (obj, exact), exact meaning the whole text was the
+    object. Raises json.JSONDecodeError when there is none.
+    """
+    text = text.strip()
+    try:
+        obj = json.loads(text)
+        if isinstance(obj, dict) and key in obj:
+            return obj, True
+    except json.JSONDecodeError:
+        pass
+
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start != -1:
+        try:
+            obj, _ = decoder.raw_decode(text, start)
+            if isinstance(obj, dict) and key in obj:
+                return obj, False
+        except json.JSONDecodeError:
+            pass
+        start = text.find("{", start + 1)
+    raise json.JSONDecodeError(f"no JSON object with {key!r}", text, 0)
+
+
+def salvage_explanation(text: str):
+    """Complete explanation string of an answer cut off after it (e.g. at max tokens), else None"""
+    stream = ExplanationStream()
+    try:
+        explanation = stream.feed(text)
+    except ValueError:  # malformed escape
+        return None
+    return explanation if stream.done else None
@@ -0,0 +1,108 @@
+# ------------------------ line_ranker.py ------------------------
+# Picks the lines of each matched heading that are worth sending to Gemini.
+# Lines are scored with BM25 against the query terms. Facts are often stored
+# as sub-blocks ("Return | Tue, 28 Oct 2025" followed by its airline, times and
+# baggage lines), so each of the top PROMPT_TOP_K lines per heading brings its
+# whole sub-block along. Lines keep their original index so data_index still
+# points into section_map.
+
+import math
+import os
+import re
+
+from tag_index import normalize_phrase
+
+PROMPT_TOP_K = int(os.getenv("PROMPT_TOP_K", "4"))  # lines per heading, 0 = send everything
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TERM_RE = re.compile(r"[a-z0-9]+")
+# Lines that open a sub-block: "Return | Tue, 28 Oct 2025", "Day 3 (Sun, ...): ...",
+# "Departure Drop (Hotel → GOX)"
+_SUBHEADER_RE = re.compile(
+    r"^(?:day\s+\d+\b"
+    r"|[^:|]{1,40}\|\s*(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*\b"
+    r"|[^:|]{1,40}\([^()]*→[^()]*\)$)",
+    re.I,
+)
+
+
+def terms(text: str) -> list:
+    return _TERM_RE.findall(normalize_phrase(text))
+
+
+def query_terms(analysis) -> set:
+    """Keyword tokens and their lemmas, split the same way as lines ('check-in' -> check, in)"""
+    found = set()
+    for token in (*analysis.tokens, *analysis.lemmas):
+        found.update(terms(token))
+    return found
+
+
+def bm25_scores(line_terms_list: list, qterms: set, doc_freq: dict, n_docs: int, avg_len: float) -> list:
+    scores = []
+    for line_terms in line_terms_list:
+        score = 0.0
+        for term in qterms:
+            tf = line_terms.count(term)
+            if not tf:
+                continue
+            idf = math.log(1 + (n_docs - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * len(line_terms) / avg_len)
+            score += idf * tf * (BM25_K1 + 1) / norm
+        scores.append(score)
+    return scores
+
+
+def sub_blocks(lines: list) -> list:
+    """
+    [(start, end)] line ranges covering a section: each sub-header runs up to
+    the next one; lines before the first sub-header (or in a section without
+    any) are blocks of their own
+    """
+    blocks, start = [], None
+    for i, line in enumerate(lines):
+        if _SUBHEADER_RE.match(line.strip()):
+            if start is not None:
+                blocks.append((start, i))
+            start = i
+        elif start is None:
+            blocks.append((i, i + 1))
+    if start is not None:
+        blocks.append((start, len(lines)))
+    return blocks
+
+
+def select_lines(analysis, top_k: int = PROMPT_TOP_K) -> dict:
+    """
+    {heading: {original line index: line}}: the sub-blocks of the top_k best
+    scoring lines per heading. Headings whose lines all score 0 keep their
+    leading blocks up to top_k lines, so a broad query still gets the start
+    of the section.
+    """
+    sections = analysis.sections
+    if top_k <= 0:
+        return {h: dict(enumerate(lines)) for h, lines in sections.items()}
+
+    qterms = query_terms(analysis)
+    # Every line of the matched sections is one BM25 document
+    tokenized = {h: [terms(line) for line in lines] for h, lines in sections.items()}
+    all_terms = [line_terms for heading_terms in tokenized.values() for line_terms in heading_terms]
+    n_docs = len(all_terms) or 1
+    avg_len = sum(len(line_terms) for line_terms in all_terms) / n_docs or 1.0
+    doc_freq = {term: sum(1 for line_terms in all_terms if term in line_terms) for term in qterms}
+
+    selected = {}
+    for heading, lines in sections.items():
+        if len(lines) <= top_k:
+            selected[heading] = dict(enumerate(lines))
+            continue
+        scores = bm25_scores(tokenized[heading], qterms, doc_freq, n_docs, avg_len)
+        ranked = sorted(range(len(lines)), key=lambda i: (-scores[i], i))[:top_k]
+        hits = {i for i in ranked if scores[i] > 0}
+        keep = set()
+        for start, end in sub_blocks(lines):
+            if hits.intersection(range(start, end)) or (not hits and len(keep) < top_k):
+                keep.update(range(start, end))
+        selected[heading] = {i: lines[i] for i in sorted(keep)}
+    return selected
@@ -0,0 +1,80 @@
+# ------------------------ llm_gate.py ------------------------
+# Bounds how many Gemini calls are in flight per process and how many requests
+# may queue behind them. When the queue is full callers get LLMBusy right away
+# (the route turns that into a 503) instead of piling up threads.
+
+import os
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))  # seconds waiting for a slot
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))  # seconds per Gemini call
+
+
+class LLMBusy(Exception):
+    """Raised when no LLM slot is free and the wait queue is full (or the wait timed out)"""
+
+
+class LLMGate:
+    """Thread-safe counting gate; requests run in the WSGI server's threads"""
+
+    def __init__(self, max_inflight: int, max_queue: int, queue_timeout: float):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self.waiting >= self.max_queue:
+                    self.rejected += 1
+                    metrics.llm_rejected.inc()
+                    raise LLMBusy("LLM queue is full")
+                self.waiting += 1
+            try:
+                acquired = self._slots.acquire(timeout=self.queue_timeout)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+            if not acquired:
+                with self._lock:
+                    self.rejected += 1
+                metrics.llm_rejected.inc()
+                raise LLMBusy("Timed out waiting for an LLM slot")
+
+        with self._lock:
+            self.inflight += 1
+
+    def release(self):
+        with self._lock:
+            self.inflight -= 1
+        self._slots.release()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+        }
+
+
+gate = LLMGate(LLM_MAX_INFLIGHT, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT)
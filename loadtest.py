@@ -0,0 +1,70 @@
+# ------------------------ loadtest.py ------------------------
+# Fires concurrent POST /ask requests at a running app and reports throughput.
+# Run the app against stub_llm.py so the numbers measure our side, not Gemini:
+#
+#   python stub_llm.py --latency 0.8 &
+#   GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=stub RATE_LIMIT_BACKEND=off python app.py &
+#   python loadtest.py --url http://127.0.0.1:5000/ask --requests 200 --concurrency 32
+#
+# RATE_LIMIT_BACKEND=off because every request comes from one IP.
+
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+QUERIES = [
+    "what is my check-in time",
+    "baggage allowance",
+    "when is my airport pickup",
+    "hotel phone number",
+    "where do we meet for the tour",
+    "what is the pnr of my return flight",
+]
+
+
+def post(url: str, query: str) -> tuple:
+    data = json.dumps({"query": query}).encode()
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = "error"
+    return status, time.perf_counter() - start
+
+
+def run(url: str, requests: int, concurrency: int) -> dict:
+    queries = [QUERIES[i % len(QUERIES)] for i in range(requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda q: post(url, q), queries))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for _, latency in results)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "rps": round(requests / elapsed, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1e3, 1),
+        "max_ms": round(latencies[-1] * 1e3, 1),
+        "status": dict(Counter(status for status, _ in results)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test for /ask")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/ask")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.url, args.requests, args.concurrency), indent=2))
@@ -12,42 +12,86 @@ canonical_headings = [
     "Contact & Escalation"
 ]
 
+import hashlib
+import json
 import os
 from dotenv import load_dotenv
+import startup
 
 load_dotenv()
 
 FILE_PATH = os.getenv("FILE_PATH")
 
-# Initialize
-section_map = {}
-current_heading = None
-current_lines = []
 
-with open(FILE_PATH, "r", encoding="utf-8") as f:
-    for line in f:
+def parse_itinerary(lines, heading_of=None) -> dict:
+    """
+    Split extracted itinerary text into {canonical heading: [lines]}.
+    heading_of(line) -> canonical heading or None replaces the exact heading
+    match (ingest_pdf.py passes a fuzzy one for PDF/OCR text).
+    """
+    section_map = {}
+    current_heading = None
+    current_lines = []
+
+    for line in lines:
         line = line.strip()
         if not line:
             continue  # skip empty lines
 
         # Check if this line is a canonical heading
-        if line in canonical_headings:
+        heading = heading_of(line) if heading_of else (line if line in canonical_headings else None)
+        if heading:
             if current_heading:
                 # Save previous section (without duplicating the heading)
                 section_map[current_heading] = current_lines
             # Start new section
-            current_heading = line
+            current_heading = heading
             current_lines = []
         else:
             # Add line to current section
             current_lines.append(line)
 
-# Save the last section
-if current_heading:
-    section_map[current_heading] = current_lines
+    # Save the last section
+    if current_heading:
+        section_map[current_heading] = current_lines
+
+    return section_map
+
+
+def section_map_version(section_map: dict) -> str:
+    """Content hash of a section map, identical across workers for the same itinerary"""
+    raw = json.dumps(section_map, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def summary_field(section_map: dict, name: str):
+    """Value of a 'Name: value' line of the Booking Summary, or None"""
+    for line in section_map.get("Booking Summary", []):
+        key, _, value = line.partition(":")
+        if key.strip().lower() == name and value.strip():
+            return value.strip()
+    return None
 
 
+def find_booking_id(section_map: dict):
+    """Booking ID from the 'Booking ID: ...' line of the Booking Summary, or None"""
+    return summary_field(section_map, "booking id")
 
+
+def find_lead_surname(section_map: dict):
+    """'Lead Traveler: Rahul Mehra (DOB: ...)' -> 'Mehra', or None"""
+    name = summary_field(section_map, "lead traveler") or summary_field(section_map, "lead traveller")
+    words = name.partition("(")[0].split() if name else []
+    return words[-1] if words else None
+
+
+# Parsed on first get_maps() call, not at import
+section_map = None
+
+
+# Hand-written tags, keyed by canonical heading. build_tags.py checks the keys,
+# expands these with tags generated from itinerary text and compiles the
+# weighted tag_index.json that query_handler loads.
 heading_tags_map = {
     "Booking Summary": [
         "booking", "summary", "itinerary", "reservation", "trip", "plan", "travel",
@@ -78,7 +122,7 @@ heading_tags_map = {
         "flight terminal", "airline boarding", "plane schedule", "flight allocation"
     ],
     "Hotel": [
-        "hotel", "room", "stay", "accommodation", "property", "lodging", "residence", "guesthouse","stay","staying","checkin","checkout","check-in","check-out",
+        "hotel", "room", "stay", "accommodation", "property", "lodging", "residence", "guesthouse","staying","checkin","checkout","check-in","check-out",
         "hotel room", "room booking", "room info", "hotel booking","house","home",
         "hotel detail", "room details", "guest room", "stay info",
         "hotel sheet", "property info", "hotel listing", "residence info",
@@ -93,7 +137,7 @@ heading_tags_map = {
     ],
     "Airport Transfers": [
         "transfer", "pickup", "cab", "shuttle", "ride", "transport", "taxi", "driver",
-        "airport pickup", "airport drop", "cab pickup", "cab drop","pickup","pick-up",
+        "airport pickup", "airport drop", "cab pickup", "cab drop","pick-up",
         "hotel pickup", "hotel drop", "ride schedule", "cab timing",
         "pickup timing", "pickup detail", "cab detail", "airport ride",
         "transport service", "cab service", "pickup service", "driver detail",
@@ -111,7 +155,7 @@ heading_tags_map = {
         "voucher sheet", "event schedule", "activity plan", "tour pass",
         "tour schedule", "excursion sheet", "trip voucher", "trip pass",
         "tour plan", "activity listing", "voucher listing", "tour ticket",
-        "event ticket", "excursion detail", "event detail", "holiday ticket","tour","meeting point","group",
+        "event ticket", "excursion detail", "event detail", "holiday ticket","meeting point","group",
         "sightseeing plan", "included activity", "voucher detail", "activity detail",
         "activity pass", "tour record", "excursion record", "event record",
         "holiday pass", "entry pass", "activity entry", "trip fun",
@@ -119,7 +163,7 @@ heading_tags_map = {
         "trip entertainment", "included voucher", "fun event", "excursion pass",
         "ticket voucher", "excursion ticket"
     ],
-    "Traveler Documents (for check-in)": [
+    "Traveler Documents": [
         "document", "documents", "passport", "visa", "id", "paper", "proof", "identity", "boarding",
         "id proof", "passport copy", "boarding pass", "travel document","carry",
         "guest id", "photo id", "entry paper", "passport page",
@@ -133,9 +177,9 @@ heading_tags_map = {
         "document file", "entry info", "travel proof", "document page",
         "boarding file", "id page"
     ],
-    "Airline Baggage Policy (Summary)": [
+    "Airline Baggage Policy": [
         "baggage", "luggage", "bag", "suitcase", "carry-on", "check-in", "allowance", "weight",
-        "baggage info", "luggage policy", "bag policy", "baggage rule","bag","bags",
+        "baggage info", "luggage policy", "bag policy", "baggage rule","bags",
         "luggage rule", "baggage limit", "baggage sheet", "luggage sheet",
         "baggage allowance", "free baggage", "included baggage", "excess baggage",
         "bag charge", "bag info", "bag guideline", "luggage detail",
@@ -146,7 +190,7 @@ heading_tags_map = {
         "baggage pass", "bag checklist", "baggage document", "airline luggage",
         "luggage allocation", "bag instruction", "luggage info", "bag document"
     ],
-    "Hotel Policies (Bayview Resort Goa)": [
+    "Hotel Policies": [
         "policy", "policies", "rule", "regulation", "condition", "guideline", "instruction", "timing",
         "hotel policy", "resort policy", "stay policy", "guest policy","checkin","checkout","check-in","check-out",
         "house rule", "house policy", "hotel rule", "room rule",
@@ -160,6 +204,13 @@ heading_tags_map = {
         "guest timing", "hotel rulesheet", "property rulesheet", "house constraints",
         "house terms", "resort rulesheet"
     ],
+    "Key Facts for Q&A": [
+        "key facts", "key fact", "quick facts", "facts", "fact sheet", "at a glance", "quick info",
+        "key info", "key details", "important details", "important info", "essentials",
+        "quick reference", "cheat sheet", "highlights", "main points", "quick summary",
+        "meeting point", "boarding point", "pickup time", "check-in time", "checkout time",
+        "hotel address", "hotel phone", "support email"
+    ],
     "Contact & Escalation": [
         "contact", "support", "help", "assistance", "helpline", "hotline", "escalation", "complaint",
         "support team", "support contact", "emergency contact", "travel support","emergency","emergencies","call",
@@ -177,4 +228,10 @@ heading_tags_map = {
 }
 
 def get_maps():
+    """Maps for the single FILE_PATH itinerary (the app serves bookings via itinerary_store)"""
+    global section_map
+    if section_map is None:
+        with startup.timed("itinerary parse"):
+            with open(FILE_PATH, "r", encoding="utf-8") as f:
+                section_map = parse_itinerary(f)
     return heading_tags_map, section_map
\ No newline at end of file
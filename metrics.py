@@ -0,0 +1,141 @@
+# ------------------------ metrics.py ------------------------
+# Minimal Prometheus text-format metrics, no client library needed.
+# Every tracing.span() is also observed into itinerary_stage_seconds, so
+# stage latencies are recorded for all requests, not just traced ones.
+# Served by app.py at /metrics.
+#
+# Everything here is per process. With several workers (gunicorn -w N) a scrape
+# through the shared port reaches one worker at random, so totals look low and
+# jump around. Run one worker per port and scrape each as its own target
+# (sum them in PromQL), or a single multi-threaded worker;
+# itinerary_worker_pid shows which process answered a scrape.
+
+import bisect
+import hashlib
+import logging
+import os
+import random
+import threading
+
+import tracing
+
+# Seconds; covers sub-ms local stages up to slow LLM calls
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_MS", "3000")) / 1e3
+SLOW_REQUEST_SAMPLE = float(os.getenv("SLOW_REQUEST_SAMPLE", "1.0"))  # fraction of slow requests logged
+
+slow_logger = logging.getLogger("itinerary.slow")
+
+_registry = []
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self._values = {} if labels else {(): 0}  # unlabelled counters start at an explicit 0
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and three adds under a lock"""
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names = name, help, labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series[:-1]):
+                cumulative += count
+                le = _labels((*self.label_names, "le"), (*labels, bound))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{base} {series[-1]}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time (cache sizes, in-flight calls, ...)"""
+
+    def __init__(self, name: str, help: str, read):
+        self.name, self.help, self.read = name, help, read
+        _registry.append(self)
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------ Metrics ------------------------
+stage_seconds = Histogram("itinerary_stage_seconds", "Time spent per pipeline stage", ("stage",))
+request_seconds = Histogram("itinerary_request_seconds", "End-to-end request latency", ("endpoint",))
+requests_total = Counter("itinerary_requests_total", "Requests by endpoint and status", ("endpoint", "status"))
+gemini_tokens = Counter("itinerary_gemini_tokens_total", "Gemini tokens reported by usage_metadata", ("kind",))
+json_parse_fallbacks = Counter("itinerary_json_parse_fallbacks_total",
+                               "Gemini answers with no usable JSON that fell back to 'contact support'")
+llm_responses = Counter("itinerary_llm_responses_total",
+                        "Gemini answers by parse outcome: exact, recovered, salvaged or failed", ("outcome",))
+invalid_citations = Counter("itinerary_invalid_citations_total",
+                            "Citations dropped as malformed, repeated or pointing at a missing line")
+contact_support = Counter("itinerary_contact_support_total",
+                          "Answers that ended in 'contact support'", ("reason",))
+answers_total = Counter("itinerary_answers_total", "Answers by source", ("source",))
+llm_rejected = Counter("itinerary_llm_rejected_total",
+                       "Requests turned away by the LLM gate (queue full or wait timed out)")
+
+tracing.add_observer(lambda name, seconds: stage_seconds.observe(seconds, name))
+
+
+def log_if_slow(endpoint: str, seconds: float, trace: dict, query: str = ""):
+    """
+    Sampled log line for requests slower than SLOW_REQUEST_MS. Queries are
+    traveller text, so only their length and a short hash (to spot repeats) are logged.
+    """
+    if seconds < SLOW_REQUEST_SECONDS or random.random() >= SLOW_REQUEST_SAMPLE:
+        return
+    stages = " ".join(f"{name}={value * 1e3:.1f}ms" for name, value in (trace or {}).items())
+    digest = hashlib.sha256(query.encode("utf-8")).hexdigest()[:12] if query else "-"
+    slow_logger.warning("slow %s %.0fms query_len=%d query_hash=%s %s",
+                        endpoint, seconds * 1e3, len(query), digest, stages)
@@ -1,36 +1,191 @@
 # ------------------------ mapping_test.py ------------------------
-from mapping import get_maps
-import spacy
-from itertools import permutations
+from mapping import canonical_headings, heading_tags_map
+from itinerary_store import itinerary_store, Itinerary
+from tag_index import TagIndex, tags_hash
+from dataclasses import dataclass, field
+from functools import lru_cache
+import logging
+import os
+import re
+import startup
+from tracing import span
 
-# ------------------------ Load maps ------------------------
-heading_tags_map, section_map = get_maps()
+logger = logging.getLogger(__name__)
+
+# ------------------------ Tag index ------------------------
+# Weighted index compiled by build_tags.py, found next to this module whatever
+# directory the server starts in; without it (or when heading_tags_map changed
+# since the build) the hand-written tags are indexed at import
+TAG_INDEX_PATH = os.getenv("TAG_INDEX_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                            "tag_index.json")
+TAG_MIN_SCORE = float(os.getenv("TAG_MIN_SCORE", "0.5"))  # summed tag weight a heading needs
+
+
+def load_tag_index() -> TagIndex:
+    if not os.path.exists(TAG_INDEX_PATH):
+        logger.warning("%s not found, run build_tags.py; using hand tags only", TAG_INDEX_PATH)
+        return TagIndex(heading_tags_map, min_score=TAG_MIN_SCORE)
+    with startup.timed("tag index load"):
+        index = TagIndex.load(TAG_INDEX_PATH, TAG_MIN_SCORE)
+    if index.source_hash == tags_hash(heading_tags_map):
+        return index
+    logger.warning("%s is stale (heading_tags_map changed), run build_tags.py; using hand tags only",
+                   TAG_INDEX_PATH)
+    return TagIndex(heading_tags_map, min_score=TAG_MIN_SCORE)
+
+
+tag_index = load_tag_index()  # phrase -> headings, built once
+
+# ------------------------ Tokenizer ------------------------
+# "spacy" uses the POS tagger, "regex" is a dependency-free word/stopword split
+QUERY_TOKENIZER = os.getenv("QUERY_TOKENIZER", "spacy").lower()
+
+# token.pos_ and token.lemma_ are used: tok2vec + tagger + attribute_ruler + lemmatizer
+SPACY_EXCLUDE = ["parser", "ner", "senter"]
+KEYWORD_POS = {"NOUN", "PROPN", "VERB"}
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "am", "do", "does", "did", "can", "could",
+    "will", "would", "should", "i", "me", "my", "we", "our", "you", "your", "it", "its", "this",
+    "that", "what", "when", "where", "which", "who", "how", "why", "of", "to", "in", "on", "at",
+    "for", "from", "by", "with", "about", "and", "or", "any", "there", "tell", "please", "give",
+    "get", "have", "has", "show", "know", "need", "want",
+}
+_WORD_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+_nlp = None
+
+
+def get_nlp():
+    """Load the slimmed spaCy pipeline on first use (None when using the regex tokenizer)"""
+    global _nlp, QUERY_TOKENIZER
+    if _nlp is None and QUERY_TOKENIZER == "spacy":
+        try:
+            import spacy
+            with startup.timed("spacy load"):
+                _nlp = spacy.load("en_core_web_sm", exclude=SPACY_EXCLUDE)  # small English model
+        except (ImportError, OSError) as e:
+            logger.warning("spaCy unavailable (%s), falling back to regex tokenizer", e)
+            QUERY_TOKENIZER = "regex"
+    return _nlp
+
+
+def _crude_lemma(word: str) -> str:
+    """Plural strip for the regex tokenizer ('bags' -> 'bag')"""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> tuple:
+    """
+    Return (keywords, lemmas, words) for a lowercased query: keywords are the
+    nouns/verbs used for tag matching, lemmas cover every non-stopword token
+    (numbers and adjectives too: "day 2" vs "day 3", "early check-in")
+    """
+    nlp = get_nlp()
+    if nlp is None:
+        words = _WORD_RE.findall(text)
+        keywords = [w for w in words if w not in STOPWORDS]
+        return keywords, [_crude_lemma(w) for w in keywords], words
+
+    return _doc_tokens(nlp(text))
+
+
+def tokenize_many(texts: list, batch_size: int = 256) -> list:
+    """tokenize() for many lowercased texts, batched through nlp.pipe"""
+    nlp = get_nlp()
+    if nlp is None:
+        return [tokenize(text) for text in texts]
+    return [_doc_tokens(doc) for doc in nlp.pipe(texts, batch_size=batch_size)]
+
+
+def _doc_tokens(doc) -> tuple:
+    keywords = [token.text for token in doc if token.pos_ in KEYWORD_POS]
+    content = [token for token in doc if not (token.is_punct or token.is_space) and token.lower_ not in STOPWORDS]
+    lemmas = [(token.lemma_ or token.text).lower() for token in content]
+    words = [token.text for token in doc if not (token.is_punct or token.is_space)]
+    return keywords, lemmas, words
 
-# ------------------------ spaCy model ------------------------
-nlp = spacy.load("en_core_web_sm")  # small English model
 
 def get_nouns(text):
     """Extract nouns and proper nouns from text using spaCy"""
-    doc = nlp(text.lower())
-    nouns = [token.text for token in doc if token.pos_ in {"NOUN", "PROPN", "VERB"}]
+    nouns, _, _ = tokenize(text.lower())
     return nouns
 
 def get_relevant_canonical_headings(query: str) -> set:
     """Return canonical headings relevant to the query"""
-    nouns = get_nouns(query)
-    matched_canonical_headings = set()
-    
-    # Generate all 1,2-word permutations of nouns
-    for r in range(1, min(2, len(nouns)+1)):
-        for perm in permutations(nouns, r):
-            phrase = " ".join(perm)
-            for heading, tags in heading_tags_map.items():
-                if heading in matched_canonical_headings:
-                    continue  # Skip this canonical heading if already matched
-                if phrase in tags:
-                    matched_canonical_headings.add(heading)
-    
-    return matched_canonical_headings
+    return set(analyze_query(query).matched_headings)
+
+
+# ------------------------ Query analysis ------------------------
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+
+
+@dataclass(frozen=True)
+class QueryAnalysis:
+    """Everything derived locally from a query, computed once per request"""
+    query: str
+    tokens: tuple                      # nouns/verbs picked by spaCy
+    lemmas: tuple                      # lemmas of every non-stopword token, in query order; cache keys
+    matched_headings: tuple            # canonical headings, in canonical order
+    sections: dict = field(default_factory=dict)  # heading -> section lines
+    booking_id: str = None             # itinerary the sections came from
+    version: str = None                # that itinerary's content version
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query.lower()).strip()
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _parse_query(normalized: str) -> tuple:
+    """spaCy parse + tag match for a normalized query; repeated questions skip spaCy"""
+    with span("spacy"):
+        tokens = tokenize(normalized)
+    return _match_headings(*tokens)
+
+
+def _match_headings(nouns, lemmas, words) -> tuple:
+    # Single nouns, 2-word noun permutations and multi-word runs of the query
+    with span("heading_match"):
+        matched = tag_index.match(nouns, words)
+    ordered = [h for h in canonical_headings if h in matched]
+    return tuple(nouns), tuple(lemmas), tuple(ordered)
+
+
+def _build_analysis(query: str, parsed: tuple, itinerary: Itinerary) -> QueryAnalysis:
+    nouns, lemmas, matched = parsed
+    section_map = itinerary.sections
+    sections = {h: section_map.get(h, []) for h in matched}
+    return QueryAnalysis(query=query, tokens=nouns, lemmas=lemmas, matched_headings=matched,
+                         sections=sections, booking_id=itinerary.booking_id, version=itinerary.version)
+
+
+def analyze_query(query: str, itinerary: Itinerary = None) -> QueryAnalysis:
+    """
+    Tokenize the query, match canonical headings and filter the itinerary's
+    sections to them (the default booking when no itinerary is given)
+    """
+    if itinerary is None:
+        itinerary = itinerary_store.get()
+    return _build_analysis(query, _parse_query(normalize_query(query)), itinerary)
+
+
+def analyze_queries(queries: list, itinerary: Itinerary = None, batch_size: int = 256) -> list:
+    """analyze_query for many queries: each distinct normalized query goes through spaCy once, via nlp.pipe"""
+    if itinerary is None:
+        itinerary = itinerary_store.get()
+    normalized = [normalize_query(q) for q in queries]
+    unique = list(dict.fromkeys(normalized))
+    parsed = dict(zip(unique, (_match_headings(*t) for t in tokenize_many(unique, batch_size))))
+    return [_build_analysis(q, parsed[n], itinerary) for q, n in zip(queries, normalized)]
+
+
+def warm_up():
+    """Load the tokenizer and itinerary now instead of on the first request"""
+    itinerary_store.get()
+    get_nlp()
 
 
 if __name__ == "__main__":
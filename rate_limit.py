@@ -0,0 +1,184 @@
+# ------------------------ rate_limit.py ------------------------
+# Per-client question limit as a token bucket: RATE_LIMIT_BURST questions
+# up front, then one more every RATE_LIMIT_REFILL_SECONDS. Unlike the old
+# hard 10-per-cookie count this refills over time and is a single O(1)
+# read-modify-write per request.
+#
+# A session gets its own bucket only once it is established (its cookie came
+# back, see session_store.py); until then requests share their IP's bucket, so
+# dropping the cookie gains nothing. Every question is also taken from a larger
+# per-IP bucket (RATE_LIMIT_IP_BURST), which caps clients that mint a fresh
+# session for each request. Set PROXY_HOPS in app.py behind a reverse proxy.
+# Stores:
+#   memory - per process, bounded LRU of buckets (default, single worker)
+#   sqlite - one row per bucket in a file shared by every worker (RATE_LIMIT_PATH)
+#   off    - no limit
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # memory | sqlite | off
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", "rate_limit.sqlite3")
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "10"))  # questions before throttling
+RATE_LIMIT_REFILL_SECONDS = float(os.getenv("RATE_LIMIT_REFILL_SECONDS", "60"))  # per question regained
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "50"))  # all clients behind one IP together
+RATE_LIMIT_IP_REFILL_SECONDS = float(os.getenv("RATE_LIMIT_IP_REFILL_SECONDS", "5"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+def refill(tokens: float, updated_at: float, now: float, burst: float, refill_seconds: float) -> float:
+    return min(burst, tokens + (now - updated_at) / refill_seconds)
+
+
+class MemoryBuckets:
+    """key -> (tokens, updated_at) in an OrderedDict LRU"""
+    name = "memory"
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, now: float, burst: float, refill_seconds: float) -> float:
+        """Tokens left after taking `cost`, or a negative shortfall (nothing taken)"""
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = refill(tokens, updated_at, now, burst, refill_seconds)
+            left = tokens - cost
+            self._buckets[key] = (left if left >= 0 else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)  # oldest buckets are the fullest anyway
+            return left
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBuckets:
+    """One row per key; BEGIN IMMEDIATE makes the read-modify-write atomic across processes"""
+    name = "sqlite"
+
+    PRUNE_EVERY = 1000  # takes between deletes of buckets that have refilled completely
+
+    def __init__(self, path: str, table: str = "buckets"):
+        self.table = table  # one per limit: pruning goes by that limit's refill time
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_updated ON {table} (updated_at)")
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, key: str, cost: float, now: float, burst: float, refill_seconds: float) -> float:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(f"SELECT tokens, updated_at FROM {self.table} WHERE key = ?",
+                                         (key,)).fetchone()
+                tokens = refill(*row, now, burst, refill_seconds) if row else burst
+                left = tokens - cost
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    (key, left if left >= 0 else tokens, now)
+                )
+                self._takes += 1
+                if self._takes % self.PRUNE_EVERY == 0:
+                    # A bucket untouched for burst * refill seconds is full again; same as no row
+                    self._conn.execute(f"DELETE FROM {self.table} WHERE updated_at < ?",
+                                       (now - burst * refill_seconds,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return left
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class RateLimiter:
+    """Token-bucket limiter; hit() returns (allowed, retry_after_seconds)"""
+
+    def __init__(self, store, burst: float, refill_seconds: float):
+        self.store = store
+        self.burst = burst
+        self.refill_seconds = refill_seconds
+        self.allowed = 0
+        self.limited = 0
+
+    def hit(self, key: str, cost: float = 1.0) -> tuple:
+        if self.store is None:
+            return True, 0.0
+        left = self.store.take(key, cost, time.time(), self.burst, self.refill_seconds)
+        if left >= 0:
+            self.allowed += 1
+            return True, 0.0
+        self.limited += 1
+        return False, round(-left * self.refill_seconds, 1)
+
+    def refund(self, key: str, cost: float = 1.0):
+        """Give a question back (e.g. the LLM was too busy to answer it)"""
+        if self.store is not None:
+            self.store.take(key, -cost, time.time(), self.burst, self.refill_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.store.name if self.store is not None else "off",
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "burst": self.burst,
+            "refill_seconds": self.refill_seconds,
+            "keys": len(self.store) if self.store is not None else 0,
+        }
+
+
+class ClientRateLimiter:
+    """A client's bucket (established session, else its IP) plus the shared per-IP bucket"""
+
+    def __init__(self, client: RateLimiter, per_ip: RateLimiter):
+        self.client = client
+        self.per_ip = per_ip
+
+    @staticmethod
+    def client_key(ip: str, sid: str = None) -> str:
+        return f"sid:{sid}" if sid else f"anon:{ip}"
+
+    def hit(self, ip: str, sid: str = None) -> tuple:
+        """(allowed, retry_after_seconds); sid only for established sessions"""
+        key = self.client_key(ip, sid)
+        allowed, retry_after = self.client.hit(key)
+        if not allowed:
+            return allowed, retry_after
+        allowed, retry_after = self.per_ip.hit(ip)
+        if not allowed:
+            self.client.refund(key)
+        return allowed, retry_after
+
+    def refund(self, ip: str, sid: str = None):
+        self.client.refund(self.client_key(ip, sid))
+        self.per_ip.refund(ip)
+
+    def stats(self) -> dict:
+        return {**self.client.stats(), "per_ip": self.per_ip.stats()}
+
+
+def make_store(name: str, table: str = "buckets"):
+    if name == "sqlite":
+        return SQLiteBuckets(RATE_LIMIT_PATH, table)
+    if name == "memory":
+        return MemoryBuckets(RATE_LIMIT_MAX_KEYS)
+    return None  # "off"
+
+
+rate_limiter = ClientRateLimiter(
+    RateLimiter(make_store(RATE_LIMIT_BACKEND), RATE_LIMIT_BURST, RATE_LIMIT_REFILL_SECONDS),
+    RateLimiter(make_store(RATE_LIMIT_BACKEND, "ip_buckets"), RATE_LIMIT_IP_BURST, RATE_LIMIT_IP_REFILL_SECONDS),
+)
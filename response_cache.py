@@ -0,0 +1,170 @@
+# ------------------------ response_cache.py ------------------------
+# Caches Gemini answers so repeated questions ("check-in time", "baggage
+# allowance") skip the LLM. Keyed on itinerary version + matched headings +
+# the query's content lemmas in order, numbers included. Backends:
+#   memory - per process, LRU + TTL (default)
+#   sqlite - file shared by every worker on the host (RESPONSE_CACHE_PATH)
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()  # memory | sqlite | off
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))  # entries
+
+
+class MemoryBackend:
+    """OrderedDict LRU with a per-entry expiry time"""
+    name = "memory"
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """SQLite table shared between processes; least recently used rows are trimmed"""
+    name = "sqlite"
+
+    TRIM_EVERY = 100  # sets between size checks, COUNT(*) is a table scan
+
+    def __init__(self, path: str, max_entries: int, table: str = "responses"):
+        self.max_entries = max_entries
+        self.table = table  # session_store.py keeps sessions in the same kind of table
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+        self._lock = threading.Lock()
+        self._sets = 0
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ? AND expires_at >= ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            self._sets += 1
+            if self._sets % self.TRIM_EVERY == 0:
+                self._trim(now)
+
+    def _trim(self, now: float):
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (now,))
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN"
+                f" (SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class ResponseCache:
+    """Answer cache with hit/miss counters; values are the parsed answer dicts"""
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def make_key(version: str, headings, lemmas, context=None) -> str:
+        """
+        lemmas: the query's full normalized token list (QueryAnalysis.lemmas);
+        order and every token count, so "day 2" and "day 3" never share an answer.
+        context: anything else the answer depends on (conversation history for follow-ups)
+        """
+        parts = [version, sorted(headings), list(lemmas)]
+        if context:
+            parts.append(context)
+        raw = json.dumps(parts)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        if self.backend is None:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def put(self, key: str, answer: dict):
+        if self.backend is None:
+            return
+        self.backend.set(key, json.dumps(answer), self.ttl)
+        self.stores += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.backend is not None else "off",
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self.backend) if self.backend is not None else 0,
+        }
+
+
+def make_backend(name: str):
+    if name == "sqlite":
+        return SQLiteBackend(RESPONSE_CACHE_PATH, RESPONSE_CACHE_SIZE)
+    if name == "memory":
+        return MemoryBackend(RESPONSE_CACHE_SIZE)
+    return None  # "off"
+
+
+response_cache = ResponseCache(make_backend(RESPONSE_CACHE_BACKEND), RESPONSE_CACHE_TTL)
@@ -0,0 +1,93 @@
+# ------------------------ session_store.py ------------------------
+# Server-side Flask sessions. The cookie only carries a random session id,
+# signed with the app's secret_key (set SECRET_KEY when running several
+# workers); the session dict lives in a backend every worker can read.
+# Backends (same ones as response_cache):
+#   memory - per process, LRU + TTL (default, single worker)
+#   sqlite - file shared by every worker on the host (SESSION_PATH)
+#
+# A new session only gets a cookie. Nothing is stored for it (and per-session
+# state like rate-limit buckets is not kept) until the client sends the signed
+# id back, so clients that drop cookies can't fill the store with one row per
+# request. Sessions that get data right away (a verified booking) are stored.
+
+import json
+import os
+import secrets
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from response_cache import MemoryBackend, SQLiteBackend
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()  # memory | sqlite
+SESSION_PATH = os.getenv("SESSION_PATH", "sessions.sqlite3")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))  # seconds since last request
+SESSION_MAX = int(os.getenv("SESSION_MAX", "100000"))  # entries before LRU eviction
+SESSION_COOKIE = os.getenv("SESSION_COOKIE", "itinerary_sid")
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """established: the client sent back a session id we issued (signed cookie)"""
+
+    def __init__(self, sid: str, initial: dict = None, new: bool = False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial or {}, on_update)
+        self.sid = sid
+        self.new = new
+        self.established = not new
+        self.modified = False
+
+
+class ServerSessionInterface(SessionInterface):
+    """Stores session dicts as JSON under an unguessable id (secrets.token_urlsafe)"""
+
+    def __init__(self, backend, ttl: float, cookie_name: str = SESSION_COOKIE):
+        self.backend = backend
+        self.ttl = ttl
+        self.cookie_name = cookie_name
+
+    @staticmethod
+    def _signer(app) -> Signer:
+        return Signer(app.secret_key, salt="itinerary-session")
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.cookie_name)
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode("ascii")
+            except BadSignature:
+                sid = None  # made up, or signed by another secret_key
+            if sid:
+                data = self.backend.get(sid)
+                return ServerSession(sid, json.loads(data) if data is not None else None)
+        return ServerSession(secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        if session:
+            # Re-saved on every request so the TTL slides with activity
+            self.backend.set(session.sid, json.dumps(dict(session)), self.ttl)
+        elif session.modified and session.established:
+            response.delete_cookie(self.cookie_name, path=self.get_cookie_path(app))
+            return
+        if session.new or session.modified:
+            response.set_cookie(
+                self.cookie_name, self._signer(app).sign(session.sid).decode("ascii"),
+                max_age=int(self.ttl),
+                path=self.get_cookie_path(app),
+                httponly=True,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def make_backend(name: str, table: str = "sessions"):
+    """Per-session storage; other per-session state (conversation.py) uses its own table"""
+    if name == "sqlite":
+        return SQLiteBackend(SESSION_PATH, SESSION_MAX, table=table)
+    return MemoryBackend(SESSION_MAX)
+
+
+session_interface = ServerSessionInterface(make_backend(SESSION_BACKEND), SESSION_TTL)
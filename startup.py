@@ -0,0 +1,42 @@
+# ------------------------ startup.py ------------------------
+# Records how long each lazily loaded piece (itinerary, spaCy, Gemini client)
+# takes, so we can see how long a fresh worker needs before it is ready.
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("itinerary.startup")
+
+# "lazy" loads spaCy / Gemini client / itinerary on first request,
+# "eager" loads them while the worker boots (before it accepts traffic)
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy").lower()
+
+_process_start = time.perf_counter()
+timings = {}  # stage -> seconds
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+        logger.info("startup: %s took %.1f ms", stage, timings[stage] * 1e3)
+
+
+def mark_ready():
+    """Record the moment the app module finished importing"""
+    timings["ready"] = time.perf_counter() - _process_start
+
+
+def report() -> dict:
+    """Stage timings in milliseconds; 'ready' is time from import start to app ready"""
+    return {stage: round(seconds * 1e3, 2) for stage, seconds in timings.items()}
+
+
+def log_report(prefix: str = "worker"):
+    parts = ", ".join(f"{stage}={ms}ms" for stage, ms in report().items())
+    logger.info("%s %d startup (%s mode): %s", prefix, os.getpid(), STARTUP_MODE, parts)
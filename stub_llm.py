@@ -0,0 +1,105 @@
+# ------------------------ stub_llm.py ------------------------
+# Local stand-in for the Gemini generateContent API, for load tests.
+# Answers every prompt with a valid itinerary JSON citing the first line sent
+# under each heading (up to three) after a configurable delay; also streams it
+# for streamGenerateContent.
+#
+#   python stub_llm.py --port 8765 --latency 0.8
+#   GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=stub gunicorn ... app:app
+
+import argparse
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_FIRST_HEADING = re.compile(r'"([^"]+)":\s*\{"(\d+)":')  # a heading and its first line sent
+
+
+def stub_answer(prompt: str) -> dict:
+    matches = _FIRST_HEADING.findall(prompt)
+    if not matches:
+        return {"explanation": "Hello! How may I help you with your trip?", "citations": []}
+    return {"explanation": f"Here is what your itinerary says about {', '.join(h for h, _ in matches)}.",
+            "citations": [{"heading": heading, "data_index": int(index)} for heading, index in matches[:3]]}
+
+
+def prompt_text(body: dict) -> str:
+    parts = [p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", [])]
+    return "\n".join(parts)
+
+
+def generate_content_response(text: str, prompt: str) -> dict:
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {
+            "promptTokenCount": len(prompt) // 4,
+            "candidatesTokenCount": len(text) // 4,
+            "totalTokenCount": (len(prompt) + len(text)) // 4,
+        },
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.5
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        prompt = prompt_text(body)
+
+        if ":streamGenerateContent" in self.path:
+            self.stream(prompt)
+            return
+        if ":generateContent" not in self.path:
+            self.send_error(404)
+            return
+
+        time.sleep(self.latency)
+        payload = json.dumps(generate_content_response(json.dumps(stub_answer(prompt)), prompt)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def stream(self, prompt: str, chunks: int = 8):
+        """streamGenerateContent?alt=sse: first chunk after 30% of latency, the rest spread out"""
+        text = json.dumps(stub_answer(prompt))
+        size = max(1, -(-len(text) // chunks))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        time.sleep(self.latency * 0.3)
+        for piece in pieces:
+            event = json.dumps(generate_content_response(piece, prompt))
+            self.wfile.write(f"data: {event}\r\n\r\n".encode())
+            self.wfile.flush()
+            time.sleep(self.latency * 0.7 / len(pieces))
+
+    def log_message(self, format, *args):
+        pass  # keep load test output readable
+
+
+def serve(port: int, latency: float) -> ThreadingHTTPServer:
+    """Build the stub server; call serve_forever() (optionally in a thread)"""
+    handler = type("Handler", (StubHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub for the Gemini API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per response")
+    args = parser.parse_args()
+
+    print(f"Stub Gemini listening on http://127.0.0.1:{args.port} ({args.latency}s latency)")
+    serve(args.port, args.latency).serve_forever()
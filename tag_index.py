@@ -0,0 +1,125 @@
+# ------------------------ tag_index.py ------------------------
+import hashlib
+import json
+import re
+from itertools import permutations
+
+_SEPARATORS = re.compile(r"[\s\-_/]+")
+
+
+def normalize_phrase(text: str) -> str:
+    """Lowercase a tag/phrase and fold hyphens, slashes and repeated spaces into one space"""
+    return _SEPARATORS.sub(" ", text.lower()).strip()
+
+
+def tags_hash(heading_tags_map: dict) -> str:
+    """Fingerprint of the hand-written tags, stored in the artifact to detect a stale build"""
+    raw = json.dumps(heading_tags_map, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class TagIndex:
+    """
+    Precompiled phrase -> headings lookup built once from heading_tags_map
+    (every tag weighs 1.0) or loaded from the weighted artifact build_tags.py
+    writes. Matching a query costs one dict lookup per candidate phrase, so it
+    does not depend on how many headings or tags exist.
+    """
+
+    FORMAT = 1
+    # A heading matched only through generated tags is dropped when another heading
+    # scores this many times more: generated tags fill gaps the hand tags leave, they
+    # should not pull a second heading in next to a clearly better one
+    GENERATED_OUTRANK = 2.0
+
+    def __init__(self, heading_tags_map: dict = None, weights: dict = None, min_score: float = 0.5,
+                 source_hash: str = None, generated: dict = None):
+        if weights is None:
+            weights = {}
+            for heading, tags in (heading_tags_map or {}).items():
+                for tag in tags:
+                    phrase = normalize_phrase(tag)
+                    if phrase:
+                        weights.setdefault(phrase, {})[heading] = 1.0
+
+        self.weights = {phrase: tuple(per_heading.items()) for phrase, per_heading in weights.items()}
+        self.phrases = {phrase: frozenset(per_heading) for phrase, per_heading in weights.items()}
+        self.max_words = max((len(p.split(" ")) for p in self.phrases), default=1)
+        self.min_score = min_score
+        self.source_hash = source_hash  # hash of the inputs the artifact was built from
+        # phrase -> headings it only reaches as a generated tag (itinerary labels)
+        self.generated = {phrase: frozenset(headings) for phrase, headings in (generated or {}).items()}
+
+    @classmethod
+    def load(cls, path: str, min_score: float = 0.5) -> "TagIndex":
+        """Load a tag_index.json written by save() (build_tags.py)"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != cls.FORMAT:
+            raise ValueError(f"{path}: unsupported tag index format {data.get('format')!r}")
+        return cls(weights=data["phrases"], min_score=min_score, source_hash=data.get("source_hash"),
+                   generated=data.get("generated"))
+
+    def save(self, path: str, **extra):
+        data = {
+            "format": self.FORMAT,
+            "source_hash": self.source_hash,
+            **extra,
+            "phrases": {phrase: dict(self.weights[phrase]) for phrase in sorted(self.weights)},
+            "generated": {phrase: sorted(self.generated[phrase]) for phrase in sorted(self.generated)},
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=0)
+            f.write("\n")
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def lookup(self, phrase: str) -> frozenset:
+        return self.phrases.get(normalize_phrase(phrase), frozenset())
+
+    def candidate_phrases(self, keywords: list, words: list = None):
+        """
+        Yield the phrases worth looking up for a query:
+        - every keyword on its own and every ordered keyword pair ("pass boarding" / "boarding pass")
+        - every contiguous run of query words up to the longest tag ("check in time")
+        """
+        keywords = [normalize_phrase(k) for k in keywords]
+        keywords = [k for k in keywords if k]
+        yield from keywords
+        for pair in permutations(keywords, 2):
+            yield " ".join(pair)
+
+        if words:
+            words = [w for w in (normalize_phrase(w) for w in words) if w]
+            for n in range(2, self.max_words + 1):
+                for i in range(len(words) - n + 1):
+                    yield " ".join(words[i:i + n])
+
+    def _scores(self, keywords: list, words: list = None) -> tuple:
+        """(heading -> summed weight, headings reached through at least one hand-written or synonym tag)"""
+        scores, backed, seen = {}, set(), set()
+        for phrase in self.candidate_phrases(keywords, words):
+            if phrase in seen:
+                continue
+            seen.add(phrase)
+            generated = self.generated.get(phrase, ())
+            for heading, weight in self.weights.get(phrase, ()):
+                scores[heading] = scores.get(heading, 0.0) + weight
+                if heading not in generated:
+                    backed.add(heading)
+        return scores, backed
+
+    def scores(self, keywords: list, words: list = None) -> dict:
+        """Summed tag weight per heading over the query's distinct candidate phrases"""
+        return self._scores(keywords, words)[0]
+
+    def match(self, keywords: list, words: list = None) -> set:
+        """
+        Return the headings whose matched tags weigh at least min_score, less
+        those reached only through generated tags that another heading outranks
+        """
+        scores, backed = self._scores(keywords, words)
+        best = max(scores.values(), default=0.0)
+        return {h for h, score in scores.items()
+                if score >= self.min_score and (h in backed or score * self.GENERATED_OUTRANK > best)}
@@ -0,0 +1,9 @@
+# ------------------------ tests/conftest.py ------------------------
+# The app's modules live flat in the repo root.
+#
+#   python -m pytest -q
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,34 @@
+# ------------------------ tests/test_app_startup.py ------------------------
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("google.genai")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_app(tmp_path, **env):
+    env = {**os.environ, "SESSION_PATH": str(tmp_path / "sessions.sqlite3"), "ITINERARY_DIR": str(tmp_path), **env}
+    return subprocess.run([sys.executable, "-c", "import app"], cwd=ROOT, env=env, capture_output=True, text=True)
+
+
+def test_shared_sessions_need_a_secret_key(tmp_path):
+    result = import_app(tmp_path, SESSION_BACKEND="sqlite", SECRET_KEY="")
+    assert result.returncode != 0
+    assert "set SECRET_KEY" in result.stderr
+
+
+def test_single_process_warns_without_a_secret_key(tmp_path):
+    result = import_app(tmp_path, SESSION_BACKEND="memory", SECRET_KEY="")
+    assert result.returncode == 0, result.stderr
+    assert "SECRET_KEY is not set" in result.stderr
+
+
+def test_shared_sessions_start_with_a_secret_key(tmp_path):
+    result = import_app(tmp_path, SESSION_BACKEND="sqlite", SECRET_KEY="test-secret")
+    assert result.returncode == 0, result.stderr
+    assert "SECRET_KEY is not set" not in result.stderr
@@ -0,0 +1,33 @@
+# ------------------------ tests/test_booking_access.py ------------------------
+from types import SimpleNamespace
+
+from booking_access import sign_link, verify_link, verify_surname
+from mapping import find_lead_surname
+
+SECRET = "test-secret"
+BOOKING = "TF-DELGOA-2025-000123"
+
+
+def test_signed_link_round_trip():
+    token = sign_link(BOOKING, ttl=60, secret=SECRET, now=1000)
+    assert verify_link(BOOKING, token, secret=SECRET, now=1000)
+
+
+def test_link_rejects_other_booking_secret_expiry_and_garbage():
+    token = sign_link(BOOKING, ttl=60, secret=SECRET, now=1000)
+    assert not verify_link("TF-DELGOA-2025-000124", token, secret=SECRET, now=1000)
+    assert not verify_link(BOOKING, token, secret="other", now=1000)
+    assert not verify_link(BOOKING, token, secret=SECRET, now=1061)
+    assert not verify_link(BOOKING, "", secret=SECRET, now=1000)
+    assert not verify_link(BOOKING, "9999999999.forged", secret=SECRET, now=1000)
+    assert not verify_link(BOOKING, token, secret=None, now=1000)
+
+
+def test_surname_check():
+    sections = {"Booking Summary": [f"Booking ID: {BOOKING}", "Lead Traveler: Rahul Mehra (DOB: 14 Mar 1990)"]}
+    itinerary = SimpleNamespace(sections=sections)
+    assert find_lead_surname(sections) == "Mehra"
+    assert verify_surname(itinerary, " mehra ")
+    assert not verify_surname(itinerary, "Rahul")
+    assert not verify_surname(itinerary, "")
+    assert not verify_surname(SimpleNamespace(sections={}), "Mehra")
@@ -0,0 +1,55 @@
+# ------------------------ tests/test_build_tags.py ------------------------
+import math
+import os
+
+from build_tags import GENERATED_WEIGHT, build, check_generated
+from mapping import canonical_headings, heading_tags_map, parse_itinerary
+from query_handler import TAG_MIN_SCORE
+from tag_index import TagIndex
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "extractedTextFull.txt")
+
+
+def test_generated_tag_shared_by_two_headings_is_live():
+    n = len(canonical_headings)
+    idf = (1 + math.log(n / 2)) / (1 + math.log(n))
+    assert GENERATED_WEIGHT * idf >= TAG_MIN_SCORE
+
+
+def test_representative_queries_resolve_through_generated_tags():
+    with open(SAMPLE, encoding="utf-8") as f:
+        index = build(heading_tags_map, [parse_itinerary(f)])
+    assert check_generated(index, heading_tags_map) == []
+
+
+def test_check_reports_queries_that_miss():
+    index = build(heading_tags_map, [])
+    problems = check_generated(index, heading_tags_map, {"phone number": "Hotel"})
+    assert len(problems) == 1 and "phone number" in problems[0]
+
+
+def test_check_reports_queries_that_match_too_much():
+    index = build(heading_tags_map, [])
+    problems = check_generated(index, heading_tags_map, {}, {"flight number": ["Flights"]})
+    assert len(problems) == 1 and "should not match 'Flights'" in problems[0]
+
+
+def test_generated_only_heading_is_dropped_next_to_a_much_better_one():
+    weights = {"passport": {"Traveler Documents": 1.0}, "passport details": {"Traveler Documents": 1.0},
+               "lead traveler": {"Traveler Documents": 0.55, "Booking Summary": 0.55},
+               "traveler": {"Booking Summary": 0.7}}
+    generated = {"lead traveler": ["Traveler Documents", "Booking Summary"], "traveler": ["Booking Summary"]}
+    index = TagIndex(weights=weights, generated=generated)
+    words = "passport details for the lead traveler".split()
+    assert index.match(["passport", "details", "lead", "traveler"], words) == {"Traveler Documents"}
+    # Without a better heading, generated tags are enough
+    assert index.match(["lead", "traveler"], ["lead", "traveler"]) == {"Booking Summary"}
+
+
+def test_generated_phrases_survive_save_and_load(tmp_path):
+    with open(SAMPLE, encoding="utf-8") as f:
+        index = build(heading_tags_map, [parse_itinerary(f)])
+    path = str(tmp_path / "tag_index.json")
+    index.save(path)
+    loaded = TagIndex.load(path, index.min_score)
+    assert loaded.generated == index.generated and loaded.generated
@@ -0,0 +1,52 @@
+# ------------------------ tests/test_citations.py ------------------------
+import pytest
+
+pytest.importorskip("google.genai")
+
+from geminiCall import MAX_CITATIONS, check_citations, validate_answer
+
+SECTIONS = {
+    "Flights": ["Outbound: 6E 5123, 24 Oct 06:10", "Return: 6E 5124, 28 Oct 19:40"],
+    "Hotel": ["Hotel Name: Sea View Resort", "Check-in: 14:00"],
+}
+SENT = {"Flights": {1: "Return: 6E 5124, 28 Oct 19:40"}, "Hotel": {1: "Check-in: 14:00"}}
+
+
+def answer(*citations):
+    return {"explanation": "...", "citations": [{"heading": h, "data_index": i} for h, i in citations]}
+
+
+def test_against_the_itinerary():
+    result = answer(("Flights", 1), ("Hotel", "1"), ("Hotel", 7), ("Spa", 0), ("Flights", 1))
+    assert check_citations(result, SECTIONS) == [
+        {"heading": "Flights", "data_index": 1, "line": "Return: 6E 5124, 28 Oct 19:40"},
+        {"heading": "Hotel", "data_index": 1, "line": "Check-in: 14:00"},
+    ]
+
+
+def test_against_the_lines_sent():
+    # Line 0 exists in the itinerary but was not in the prompt
+    assert [c["data_index"] for c in check_citations(answer(("Flights", 0), ("Flights", 1)), SENT)] == [1]
+
+
+def test_malformed_citations_are_dropped():
+    result = {"citations": ["Flights", {"heading": "Flights"}, {"heading": "Hotel", "data_index": True},
+                            {"heading": 3, "data_index": 0}, {"heading": "Hotel", "data_index": "x"}]}
+    assert check_citations(result, SECTIONS) == []
+    assert check_citations(result) == []
+
+
+def test_single_citation_format_and_cap():
+    assert check_citations({"heading": "Hotel", "data_index": 0}, SECTIONS)[0]["line"] == "Hotel Name: Sea View Resort"
+    assert check_citations({"heading": "na", "data_index": -1}, SECTIONS) == []
+    many = answer(*[("Flights", 0), ("Flights", 1), ("Hotel", 0), ("Hotel", 1)])
+    assert len(check_citations(many, SECTIONS)) == MAX_CITATIONS
+
+
+def test_validate_answer_mirrors_first_citation():
+    result = validate_answer(answer(("Flights", 0), ("Hotel", 1)), SENT)
+    assert result["citations"] == [{"heading": "Hotel", "data_index": 1}]
+    assert (result["heading"], result["data_index"]) == ("Hotel", 1)
+
+    empty = validate_answer(answer(("Spa", 0)), SENT)
+    assert empty["citations"] == [] and (empty["heading"], empty["data_index"]) == ("na", -1)
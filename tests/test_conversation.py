@@ -0,0 +1,60 @@
+# ------------------------ tests/test_conversation.py ------------------------
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("itsdangerous")
+
+from conversation import ConversationStore, is_followup
+from query_handler import QueryAnalysis
+from session_store import make_backend
+
+BOOKING = "TF-TEST-0001"
+ITINERARY = SimpleNamespace(sections={"Hotel": ["Hotel Name: Sea View", "Phone: +91 832 000"],
+                                      "Airport Transfers": ["Vehicle: AC Sedan"]})
+
+
+def analysis(query, *headings):
+    return QueryAnalysis(query=query, tokens=(), lemmas=tuple(query.split()), matched_headings=headings,
+                         sections={h: ITINERARY.sections[h] for h in headings}, booking_id=BOOKING, version="v1")
+
+
+def store_after(query, *headings):
+    store = ConversationStore(make_backend("memory"), ttl=60)
+    state = store.get("sid")
+    store.record("sid", state, analysis(query, *headings), {"explanation": "ok", "heading": headings[0]})
+    return store, store.get("sid")
+
+
+@pytest.mark.parametrize("query, headings", [
+    ("is there a baby cot", ()),
+    ("is there wifi at this hotel", ("Hotel",)),
+    ("what is that hotel phone number", ("Hotel",)),
+    ("when does it leave", ("Airport Transfers",)),
+])
+def test_standalone_questions_are_not_followups(query, headings):
+    assert not is_followup(query, headings)
+
+
+@pytest.mark.parametrize("query, headings", [
+    ("when does it leave", ()),
+    ("is it refundable", ()),
+    ("and the hotel phone?", ("Hotel",)),
+    ("what about the pickup", ("Airport Transfers",)),
+])
+def test_followups(query, headings):
+    assert is_followup(query, headings)
+
+
+def test_standalone_question_keeps_its_own_analysis():
+    store, state = store_after("which vehicle is coming", "Airport Transfers")
+    query = analysis("is there wifi at this hotel", "Hotel")
+    resolved, history, followup = store.resolve(query, state, ITINERARY)
+    assert resolved is query and history is None and not followup
+
+
+def test_followup_inherits_headings_and_history():
+    store, state = store_after("which vehicle is coming", "Airport Transfers")
+    resolved, history, followup = store.resolve(analysis("and the hotel phone?", "Hotel"), state, ITINERARY)
+    assert followup and resolved.matched_headings == ("Hotel", "Airport Transfers")
+    assert history == [{"user": "which vehicle is coming", "assistant": "ok"}]
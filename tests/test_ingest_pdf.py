@@ -0,0 +1,66 @@
+# ------------------------ tests/test_ingest_pdf.py ------------------------
+import sys
+
+import pytest
+
+import ingest_pdf
+from ingest_pdf import NoSections, sections_from_pages, text_lines
+
+
+def page(number, *lines):
+    return number, "\n".join(lines), "text"
+
+
+def test_running_header_and_footer_removed():
+    pages = [page(n, "TripFactory Itinerary", f"Body line {n}", "Confidential", f"Page {n + 1} of 3")
+             for n in range(3)]
+    assert text_lines(pages) == ["Body line 0", "Body line 1", "Body line 2"]
+
+
+def test_repeated_body_line_kept():
+    pages = [
+        page(0, "TripFactory Itinerary", "Airport Transfers", "Arrival pickup", "Vehicle: AC Sedan",
+             "Driver: Ramesh", "Notes", "Confidential"),
+        page(1, "TripFactory Itinerary", "Departure drop", "Pickup: 06:00", "Vehicle: AC Sedan",
+             "Vendor Ref: GT-1", "Extra", "Confidential"),
+        page(2, "TripFactory Itinerary", "Local day trip", "Pickup: 09:00", "Vehicle: AC Sedan",
+             "Driver: Suresh", "Confidential"),
+    ]
+    lines = text_lines(pages)
+    assert lines.count("Vehicle: AC Sedan") == 3
+    assert "TripFactory Itinerary" not in lines and "Confidential" not in lines
+
+
+def test_same_text_at_other_positions_kept():
+    pages = [page(0, "Hotel", "a", "b", "c", "d", "e", "f"),
+             page(1, "x", "y", "Hotel", "z", "w", "v", "u"),
+             page(2, "p", "q", "r", "s", "t", "Hotel", "o")]
+    assert text_lines(pages).count("Hotel") == 3
+
+
+def test_two_pages_keep_everything():
+    pages = [page(0, "Header", "one"), page(1, "Header", "two")]
+    assert text_lines(pages) == ["Header", "one", "Header", "two"]
+
+
+def test_headingless_document_is_an_error():
+    pages = [(0, "", "ocr"), (1, "Thank you for booking with us", "text")]
+    with pytest.raises(NoSections, match="1 image pages gave no OCR text"):
+        sections_from_pages(pages)
+    with pytest.raises(NoSections):
+        sections_from_pages([(0, "Hotel\n", "text")])  # a heading with nothing under it
+
+
+def test_sections_found():
+    assert sections_from_pages([page(0, "Hotel", "Phone: +91 832 000")]) == {"Hotel": ["Phone: +91 832 000"]}
+
+
+@pytest.mark.parametrize("fmt", ["json", "text", "itn"])
+def test_headingless_document_fails_the_run(monkeypatch, capsys, fmt):
+    error = NoSections("no itinerary sections found in 2 pages")
+    monkeypatch.setattr(ingest_pdf, "ingest_many", lambda paths, workers: {path: error for path in paths})
+    monkeypatch.setattr(sys, "argv", ["ingest_pdf.py", "scan.pdf", "--format", fmt])
+    with pytest.raises(SystemExit) as exit_info:
+        ingest_pdf.main()
+    assert exit_info.value.code == 1
+    assert capsys.readouterr().out == ""
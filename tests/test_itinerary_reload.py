@@ -0,0 +1,57 @@
+# ------------------------ tests/test_itinerary_reload.py ------------------------
+import os
+
+from itinerary_reload import ItineraryReloader
+from itinerary_store import ItineraryStore
+
+BOOKING = "TF-TEST-0001"
+
+
+def write(path, hotel, mtime_ns=None):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"Booking Summary\nBooking ID: {BOOKING}\nHotel\nHotel Name: {hotel}\n")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def new_store(directory):
+    return ItineraryStore(str(directory), capacity=4, default_source=None, default_booking_id=None)
+
+
+def test_edit_before_first_poll_is_reloaded(tmp_path):
+    source = tmp_path / f"{BOOKING}.txt"
+    write(source, "Sea View", mtime_ns=1_000_000_000)
+    store = new_store(tmp_path)
+    assert store.get(BOOKING).sections["Hotel"] == ["Hotel Name: Sea View"]
+
+    write(source, "Palm Grove", mtime_ns=2_000_000_000)  # before the reloader has ever polled
+    reloader = ItineraryReloader(store, interval=0)
+    assert reloader.check_once() == [BOOKING]
+    assert store.get(BOOKING).sections["Hotel"] == ["Hotel Name: Palm Grove"]
+    assert reloader.check_once() == []
+
+
+def test_unchanged_source_is_not_reloaded(tmp_path):
+    write(tmp_path / f"{BOOKING}.txt", "Sea View")
+    store = new_store(tmp_path)
+    store.get(BOOKING)
+    assert ItineraryReloader(store, interval=0).check_once() == []
+
+
+def test_restart_registers_source_and_recompiles_newer_text(tmp_path):
+    source = tmp_path / f"{BOOKING}.txt"
+    write(source, "Sea View", mtime_ns=1_000_000_000)
+    new_store(tmp_path).get(BOOKING)
+    itn = tmp_path / f"{BOOKING}.itn"
+    os.utime(itn, ns=(2_000_000_000, 2_000_000_000))
+
+    # Edited while the app was down: newer than the .itn
+    write(source, "Palm Grove", mtime_ns=3_000_000_000)
+    store = new_store(tmp_path)
+    assert store.get(BOOKING).sections["Hotel"] == ["Hotel Name: Palm Grove"]
+    assert store.sources[BOOKING] == str(source)
+
+    # Still watched after the restart
+    write(source, "Lagoon", mtime_ns=4_000_000_000)
+    assert ItineraryReloader(store, interval=0).check_once() == [BOOKING]
+    assert store.get(BOOKING).sections["Hotel"] == ["Hotel Name: Lagoon"]
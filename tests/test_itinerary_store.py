@@ -0,0 +1,43 @@
+# ------------------------ tests/test_itinerary_store.py ------------------------
+import threading
+
+import itinerary_store
+from itinerary_store import Itinerary, ItineraryStore, compile_sections
+
+BOOKING = "TF-TEST-0001"
+
+
+def run_together(target, args_list):
+    start = threading.Barrier(len(args_list))
+
+    def run(*args):
+        start.wait()
+        target(*args)
+
+    threads = [threading.Thread(target=run, args=args) for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_compiles_of_one_booking_leave_a_valid_file(tmp_path):
+    path = str(tmp_path / f"{BOOKING}.itn")
+    maps = [{"Hotel": [f"Hotel Name: {name}" * 2000]} for name in ("Sea View", "Palm Grove", "Lagoon", "Reef")]
+    for _ in range(10):
+        run_together(compile_sections, [(m, BOOKING, path) for m in maps])
+        assert Itinerary(path).sections["Hotel"] in [m["Hotel"] for m in maps]
+    assert [p.name for p in tmp_path.iterdir()] == [f"{BOOKING}.itn"]  # no temp files left behind
+
+
+def test_first_gets_of_one_booking_compile_once(tmp_path, monkeypatch):
+    (tmp_path / f"{BOOKING}.txt").write_text(f"Booking Summary\nBooking ID: {BOOKING}\n", encoding="utf-8")
+    calls = []
+    compile_text = itinerary_store.compile_text
+    monkeypatch.setattr(itinerary_store, "compile_text", lambda *a, **k: calls.append(a) or compile_text(*a, **k))
+
+    store = ItineraryStore(str(tmp_path), capacity=4, default_source=None, default_booking_id=None)
+    found = []
+    run_together(lambda: found.append(store.get(BOOKING)), [()] * 8)
+    assert len(calls) == 1
+    assert len({id(itinerary) for itinerary in found}) == 1
@@ -0,0 +1,54 @@
+# ------------------------ tests/test_json_stream.py ------------------------
+import json
+
+import pytest
+
+from json_stream import ExplanationStream, find_object, salvage_explanation
+
+ANSWER = {"explanation": "Check-in is at 2 PM — \"early\" on request 😊\nEnjoy!",
+          "citations": [{"heading": "Hotel", "data_index": 1}]}
+
+
+def feed_all(chunks):
+    stream = ExplanationStream()
+    return "".join(stream.feed(chunk) for chunk in chunks), stream
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 1000])
+def test_stream_decodes_across_any_chunking(size):
+    text = json.dumps(ANSWER)  # ascii escapes, incl. a surrogate pair
+    explanation, stream = feed_all([text[i:i + size] for i in range(0, len(text), size)])
+    assert explanation == ANSWER["explanation"]
+    assert stream.done and stream.text == text
+
+
+def test_stream_stops_at_the_closing_quote():
+    explanation, stream = feed_all(['{"explanation": "Hi', ' there", "citations": ', '[{"heading": "x"}]}'])
+    assert explanation == "Hi there"
+    assert stream.feed("more") == ""
+
+
+def test_stream_without_explanation_yields_nothing():
+    explanation, stream = feed_all(['{"citations": [', "]}"])
+    assert explanation == "" and not stream.done
+
+
+def test_find_object_exact_fenced_and_prose():
+    text = json.dumps(ANSWER)
+    assert find_object(text) == (ANSWER, True)
+    assert find_object(f"```json\n{text}\n```") == (ANSWER, False)
+    assert find_object('Sure! {"note": 1} then ' + text + " hope this helps") == (ANSWER, False)
+
+
+def test_find_object_raises_without_an_answer():
+    with pytest.raises(json.JSONDecodeError):
+        find_object('{"citations": []}')
+    with pytest.raises(json.JSONDecodeError):
+        find_object("I can't help with that")
+
+
+def test_salvage_truncated_answer():
+    assert salvage_explanation('{"explanation": "Pickup at 9 AM.", "citations": [{"head') == "Pickup at 9 AM."
+    assert salvage_explanation('{"explanation": "Pickup at 9') is None
+    assert salvage_explanation('{"explanation": "bad \\uZZZZ escape"}') is None
+    assert salvage_explanation("no json here") is None
@@ -0,0 +1,87 @@
+# ------------------------ tests/test_line_ranker.py ------------------------
+import os
+from types import SimpleNamespace
+
+from line_ranker import query_terms, select_lines, sub_blocks
+from mapping import parse_itinerary
+from query_handler import normalize_query, tokenize
+
+ACTIVITIES = [
+    "Day 1 (Fri, 24 Oct 2025): Arrival and leisure",
+    "Day 2 (Sat, 25 Oct 2025): North Goa Highlights (Shared Tour)",
+    "Pickup Point: Hotel lobby at 09:00",
+    "Day 3 (Sun, 26 Oct 2025): Dudhsagar Falls (Private Tour)",
+    "Voucher: ACT-5521",
+    "Day 4 (Mon, 27 Oct 2025): Departure",
+]
+
+
+def analysis(tokens, lemmas, sections):
+    return SimpleNamespace(tokens=tuple(tokens), lemmas=tuple(lemmas), sections=sections)
+
+
+def test_query_terms_split_like_lines():
+    terms = query_terms(analysis(["check-in"], ["check-in", "early"], {}))
+    assert terms == {"check", "in", "early"}
+
+
+def test_keeps_top_k_under_original_indexes():
+    a = analysis(["pickup", "point"], ["pickup", "point"], {"Activities & Vouchers": ACTIVITIES})
+    selected = select_lines(a, top_k=2)["Activities & Vouchers"]
+    assert len(selected) == 2
+    assert selected[2] == ACTIVITIES[2]
+    assert list(selected) == sorted(selected)
+
+
+def test_numbers_rank_the_right_day():
+    a = analysis(["activity", "day"], ["activity", "day", "3"], {"Activities & Vouchers": ACTIVITIES})
+    assert 3 in select_lines(a, top_k=1)["Activities & Vouchers"]
+
+
+def test_short_sections_and_no_matches_keep_leading_lines():
+    sections = {"Hotel": ["Hotel Name: Sea View"], "Activities & Vouchers": ACTIVITIES}
+    selected = select_lines(analysis(["zebra"], ["zebra"], sections), top_k=3)
+    assert selected["Hotel"] == {0: "Hotel Name: Sea View"}
+    assert list(selected["Activities & Vouchers"]) == [0, 1, 2]
+
+
+def test_sub_blocks_run_to_the_next_sub_header():
+    lines = ["Note: carry ID", "Outbound | Fri, 24 Oct 2025", "From: DEL 06:35", "Return | Tue, 28 Oct 2025",
+             "From: GOX 18:25", "Arrival Pickup (GOX → Hotel)", "Date/Time: 09:20"]
+    assert sub_blocks(lines) == [(0, 1), (1, 3), (3, 5), (5, 7)]
+    assert sub_blocks(["Check-in: 14:00", "Check-out: 11:00"]) == [(0, 1), (1, 2)]
+
+
+def test_top_k_zero_sends_everything():
+    sections = {"Activities & Vouchers": ACTIVITIES}
+    assert select_lines(analysis(["tour"], ["tour"], sections), top_k=0) == {
+        "Activities & Vouchers": dict(enumerate(ACTIVITIES))}
+
+
+# The bundled sample itinerary keeps each fact in a multi-line sub-block
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "extractedTextFull.txt")
+with open(SAMPLE, encoding="utf-8") as _f:
+    SAMPLE_SECTIONS = parse_itinerary(_f)
+
+
+def sample_selection(query, heading):
+    keywords, lemmas, _ = tokenize(normalize_query(query))
+    a = analysis(keywords, lemmas, {heading: SAMPLE_SECTIONS[heading]})
+    return list(select_lines(a)[heading].values())
+
+
+def test_return_flight_keeps_its_times():
+    sent = sample_selection("what time is my return flight", "Flights")
+    assert any("18:25" in line for line in sent)
+    assert any(line.startswith("Return |") for line in sent)
+
+
+def test_cruise_keeps_its_time():
+    sent = sample_selection("when is the cruise", "Activities & Vouchers")
+    assert any("17:30-19:00" in line for line in sent)
+
+
+def test_departure_drop_keeps_its_date_and_time():
+    sent = sample_selection("when is the departure drop", "Airport Transfers")
+    assert any("15:25" in line for line in sent)
+    assert not any("09:20" in line for line in sent)  # the arrival block stays out
@@ -0,0 +1,41 @@
+# ------------------------ tests/test_parse_response.py ------------------------
+import json
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+from geminiCall import InvalidAnswer, PARSE_ERRORS, parse_response_text
+
+SENT = {"Hotel": {0: "Hotel Name: Sea View Resort", 1: "Check-in: 14:00"}}
+
+
+def test_exact_answer_with_citations_checked_against_sent():
+    text = json.dumps({"explanation": "Check-in is at 2 PM.",
+                       "citations": [{"heading": "Hotel", "data_index": 1}, {"heading": "Flights", "data_index": 0}]})
+    result = parse_response_text(text, SENT)
+    assert result["citations"] == [{"heading": "Hotel", "data_index": 1}]
+    assert (result["heading"], result["data_index"]) == ("Hotel", 1)
+
+
+def test_recovered_from_fences():
+    text = '```json\n{"explanation": "Hi!", "citations": []}\n```'
+    assert parse_response_text(text, SENT)["explanation"] == "Hi!"
+
+
+def test_salvaged_when_truncated():
+    result = parse_response_text('{"explanation": "Check-in is at 2 PM.", "citations": [{"heading": "Ho', SENT)
+    assert result["explanation"] == "Check-in is at 2 PM."
+    assert result["citations"] == [] and result["heading"] == "na"
+
+
+@pytest.mark.parametrize("text", ['{"explanation": "   ", "citations": []}', '{"explanation": 3}',
+                                  "no json at all", '{"explanation": "cut'])
+def test_unusable_answers_raise_parse_errors(text):
+    with pytest.raises(PARSE_ERRORS):
+        parse_response_text(text, SENT)
+
+
+def test_blank_explanation_is_invalid_answer():
+    with pytest.raises(InvalidAnswer):
+        parse_response_text('{"explanation": "", "citations": []}')
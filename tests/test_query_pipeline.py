@@ -0,0 +1,87 @@
+# ------------------------ tests/test_query_pipeline.py ------------------------
+# query_itinerary and stream_itinerary share the steps around the Gemini call;
+# both must map the same failure to the same answer.
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("google.genai")
+
+import geminiCall
+from geminiCall import NOT_FOUND, TIMED_OUT, query_itinerary, stream_itinerary
+from query_handler import QueryAnalysis
+
+_versions = itertools.count()
+
+
+def analysis(query="what time is check-in", headings=("Hotel",)):
+    sections = {"Hotel": ["Hotel Name: Sea View Resort", "Check-in: 14:00"]} if headings else {}
+    return QueryAnalysis(query=query, tokens=(), lemmas=tuple(query.split()), matched_headings=headings,
+                         sections=sections, booking_id="TF-TEST-0001", version=f"test-{next(_versions)}")
+
+
+class FakeModels:
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+    def _result(self):
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return SimpleNamespace(text=self.outcome, usage_metadata=None)
+
+    def generate_content(self, **kwargs):
+        return self._result()
+
+    def generate_content_stream(self, **kwargs):
+        yield self._result()
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    def use(outcome):
+        monkeypatch.setattr(geminiCall, "get_client", lambda: SimpleNamespace(models=FakeModels(outcome)))
+    return use
+
+
+def both(query_analysis):
+    """(query_itinerary's answer, stream_itinerary's done event) for the same analysis"""
+    answer = query_itinerary(query_analysis.query, query_analysis, skip_fast_path=True)
+    events = list(stream_itinerary(query_analysis.query, query_analysis, skip_fast_path=True))
+    assert events[-1][0] == "done"
+    return answer, events[-1][1]
+
+
+@pytest.mark.parametrize("outcome, expected", [
+    ("not json at all", NOT_FOUND),
+    (httpx.ReadTimeout("slow"), TIMED_OUT),
+])
+def test_failures_map_to_the_same_answer(gemini, outcome, expected):
+    gemini(outcome)
+    answer, streamed = both(analysis())
+    assert answer["explanation"] == streamed["explanation"] == expected["explanation"]
+
+
+def test_other_errors(gemini):
+    gemini(RuntimeError("boom"))
+    answer, streamed = both(analysis())
+    assert answer["explanation"] == streamed["explanation"] == "Error: boom"
+    with pytest.raises(RuntimeError):
+        query_itinerary("q", analysis(), raise_errors=True, skip_fast_path=True)
+
+
+def test_answer_then_cache(gemini):
+    gemini('{"explanation": "Check-in is at 2 PM.", "citations": [{"heading": "Hotel", "data_index": 1}]}')
+    first = analysis()
+    answer = query_itinerary(first.query, first, skip_fast_path=True)
+    assert (answer["heading"], answer["data_index"]) == ("Hotel", 1)
+    gemini(RuntimeError("not called"))
+    events = list(stream_itinerary(first.query, first, skip_fast_path=True))
+    assert events == [("token", "Check-in is at 2 PM."), ("done", answer)]
+
+
+def test_no_match_skips_gemini(gemini):
+    gemini(RuntimeError("not called"))
+    answer, streamed = both(analysis(headings=()))
+    assert answer["explanation"] == streamed["explanation"] == NOT_FOUND["explanation"]
@@ -0,0 +1,90 @@
+# ------------------------ tests/test_rate_limit.py ------------------------
+import pytest
+
+from rate_limit import ClientRateLimiter, MemoryBuckets, RateLimiter, SQLiteBuckets, refill
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteBuckets(str(tmp_path / "buckets.sqlite3"))
+    return MemoryBuckets(max_keys=100)
+
+
+def frozen(monkeypatch, start=1000.0):
+    clock = [start]
+    monkeypatch.setattr("rate_limit.time.time", lambda: clock[0])
+    return clock
+
+
+def test_refill_is_capped_at_burst():
+    assert refill(0, 0, 30, burst=10, refill_seconds=60) == 0.5
+    assert refill(9, 0, 600, burst=10, refill_seconds=60) == 10
+
+
+def test_burst_then_retry_after_then_refill(store, monkeypatch):
+    clock = frozen(monkeypatch)
+    limiter = RateLimiter(store, burst=3, refill_seconds=60)
+    assert [limiter.hit("a")[0] for _ in range(3)] == [True, True, True]
+    assert limiter.hit("a") == (False, 60.0)
+    assert limiter.hit("b")[0]  # other keys are untouched
+    clock[0] += 60
+    assert limiter.hit("a")[0]
+    assert not limiter.hit("a")[0]
+
+
+def test_refund_gives_a_question_back(store, monkeypatch):
+    frozen(monkeypatch)
+    limiter = RateLimiter(store, burst=1, refill_seconds=60)
+    assert limiter.hit("a")[0]
+    limiter.refund("a")
+    assert limiter.hit("a")[0]
+
+
+def test_off_store_always_allows():
+    limiter = RateLimiter(None, burst=1, refill_seconds=60)
+    assert all(limiter.hit("a")[0] for _ in range(5))
+    assert limiter.stats()["backend"] == "off"
+
+
+def test_memory_buckets_are_bounded():
+    store = MemoryBuckets(max_keys=2)
+    for key in "abc":
+        store.take(key, 1, 0, 10, 60)
+    assert len(store) == 2
+
+
+def client_limiter(burst=3, ip_burst=5):
+    return ClientRateLimiter(RateLimiter(MemoryBuckets(100), burst, 60),
+                             RateLimiter(MemoryBuckets(100), ip_burst, 60))
+
+
+def test_dropping_the_cookie_does_not_reset_the_limit(monkeypatch):
+    # Regression: the bucket was keyed on session.sid and every cookieless request got a new one
+    frozen(monkeypatch)
+    limiter = client_limiter(burst=3)
+    assert [limiter.hit("10.0.0.1")[0] for _ in range(4)] == [True, True, True, False]
+    assert limiter.hit("10.0.0.2")[0]
+
+
+def test_rotating_sessions_are_capped_per_ip(monkeypatch):
+    frozen(monkeypatch)
+    limiter = client_limiter(burst=3, ip_burst=5)
+    allowed = [limiter.hit("10.0.0.1", f"sid-{n}")[0] for n in range(8)]
+    assert allowed == [True] * 5 + [False] * 3
+
+
+def test_established_session_has_its_own_bucket(monkeypatch):
+    frozen(monkeypatch)
+    limiter = client_limiter(burst=2, ip_burst=10)
+    assert [limiter.hit("10.0.0.1", "alice")[0] for _ in range(3)] == [True, True, False]
+    assert limiter.hit("10.0.0.1", "bob")[0]  # same NAT, different traveller
+
+
+def test_ip_rejection_refunds_the_client_bucket(monkeypatch):
+    frozen(monkeypatch)
+    limiter = client_limiter(burst=2, ip_burst=1)
+    assert limiter.hit("10.0.0.1", "alice")[0]
+    assert not limiter.hit("10.0.0.1", "alice")[0]  # per-IP bucket is empty
+    limiter.per_ip.refund("10.0.0.1")
+    assert limiter.hit("10.0.0.1", "alice")[0]  # alice's own bucket still had one left
@@ -0,0 +1,87 @@
+# ------------------------ tests/test_response_cache.py ------------------------
+from types import SimpleNamespace
+
+import query_handler
+from response_cache import MemoryBackend, ResponseCache, SQLiteBackend
+
+HEADINGS = ("Activities & Vouchers",)
+
+
+def spacy_token(text, pos, lemma=None, punct=False):
+    return SimpleNamespace(text=text, lower_=text.lower(), pos_=pos, lemma_=lemma or text,
+                           is_punct=punct, is_space=False)
+
+
+def test_key_depends_on_numbers():
+    day2 = ResponseCache.make_key("v1", HEADINGS, ["activity", "day", "2"])
+    day3 = ResponseCache.make_key("v1", HEADINGS, ["activity", "day", "3"])
+    assert day2 != day3
+
+
+def test_key_depends_on_order_and_context():
+    there = ResponseCache.make_key("v1", HEADINGS, ["delhi", "goa"])
+    back = ResponseCache.make_key("v1", HEADINGS, ["goa", "delhi"])
+    assert there != back
+    assert ResponseCache.make_key("v1", HEADINGS, ["goa"], [{"user": "hi"}]) != \
+        ResponseCache.make_key("v1", HEADINGS, ["goa"])
+
+
+def test_key_ignores_heading_order_and_empty_context():
+    a = ResponseCache.make_key("v1", ["Hotel", "Flights"], ["time"])
+    assert a == ResponseCache.make_key("v1", ["Flights", "Hotel"], ["time"], None)
+    assert a == ResponseCache.make_key("v1", ["Flights", "Hotel"], ["time"], [])
+
+
+def test_spacy_lemmas_keep_numbers_and_adjectives():
+    # "activity on day 2?" / "early check-in" as the spaCy tagger sees them
+    doc = [spacy_token("activity", "NOUN"), spacy_token("on", "ADP"), spacy_token("day", "NOUN"),
+           spacy_token("2", "NUM"), spacy_token("?", "PUNCT", punct=True)]
+    keywords, lemmas, _ = query_handler._doc_tokens(doc)
+    assert keywords == ["activity", "day"]
+    assert lemmas == ["activity", "day", "2"]
+
+    early = [spacy_token("early", "ADJ"), spacy_token("check", "NOUN"), spacy_token("-", "PUNCT", punct=True),
+             spacy_token("in", "ADP")]
+    plain = early[1:]
+    assert query_handler._doc_tokens(early)[1] == ["early", "check"]
+    assert query_handler._doc_tokens(plain)[1] == ["check"]
+
+
+def test_regex_tokenizer_keys_differ(monkeypatch):
+    monkeypatch.setattr(query_handler, "QUERY_TOKENIZER", "regex")
+    monkeypatch.setattr(query_handler, "_nlp", None)
+    key = lambda q: ResponseCache.make_key("v1", HEADINGS, query_handler.tokenize(query_handler.normalize_query(q))[1])
+    assert key("activity on day 2") != key("activity on day 3")
+    assert key("early check-in") != key("check-in")
+    assert key("What is the activity on day 2") == key("activity day 2")
+
+
+def test_memory_backend_lru_and_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("response_cache.time.time", lambda: clock[0])
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", "1", ttl=10)
+    backend.set("b", "2", ttl=10)
+    assert backend.get("a") == "1"       # a is now most recently used
+    backend.set("c", "3", ttl=10)        # evicts b
+    assert backend.get("b") is None
+    clock[0] += 11
+    assert backend.get("a") is None
+    assert backend.get("c") is None
+
+
+def test_sqlite_backend_round_trip(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"), max_entries=10)
+    backend.set("k", "v", ttl=60)
+    assert backend.get("k") == "v"
+    assert len(backend) == 1
+
+
+def test_response_cache_counts_hits_and_misses():
+    cache = ResponseCache(MemoryBackend(10), ttl=60)
+    key = cache.make_key("v1", HEADINGS, ["tour"])
+    assert cache.get(key) is None
+    cache.put(key, {"explanation": "Tour at 9", "citations": []})
+    assert cache.get(key) == {"explanation": "Tour at 9", "citations": []}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (1, 1, 1)
@@ -0,0 +1,65 @@
+# ------------------------ tests/test_session_store.py ------------------------
+import pytest
+
+flask = pytest.importorskip("flask")
+
+from response_cache import MemoryBackend
+from session_store import ServerSessionInterface
+
+COOKIE = "test_sid"
+
+
+@pytest.fixture
+def app_and_backend():
+    app = flask.Flask(__name__)
+    app.secret_key = "test-secret"
+    backend = MemoryBackend(100)
+    app.session_interface = ServerSessionInterface(backend, ttl=60, cookie_name=COOKIE)
+
+    @app.route("/whoami")
+    def whoami():
+        return {"sid": flask.session.sid, "established": flask.session.established}
+
+    @app.route("/remember")
+    def remember():
+        flask.session["booking_id"] = "TF-1"
+        return {"sid": flask.session.sid}
+
+    return app, backend
+
+
+def test_cookieless_requests_store_nothing(app_and_backend):
+    # Regression: every cookieless request used to leave a session row behind
+    app, backend = app_and_backend
+    client = app.test_client(use_cookies=False)
+    sids = {client.get("/whoami").json["sid"] for _ in range(5)}
+    assert len(sids) == 5
+    assert len(backend) == 0
+
+
+def test_session_is_established_once_its_cookie_comes_back(app_and_backend):
+    app, backend = app_and_backend
+    client = app.test_client()
+    first = client.get("/whoami").json
+    second = client.get("/whoami").json
+    assert not first["established"]
+    assert second == {"sid": first["sid"], "established": True}
+    assert len(backend) == 0  # still no data to keep
+
+
+def test_forged_cookie_is_a_new_session(app_and_backend):
+    app, _ = app_and_backend
+    client = app.test_client()
+    client.set_cookie(COOKIE, "made-up-session-id")
+    response = client.get("/whoami").json
+    assert not response["established"]
+    assert response["sid"] != "made-up-session-id"
+
+
+def test_session_data_is_kept(app_and_backend):
+    app, backend = app_and_backend
+    client = app.test_client()
+    sid = client.get("/remember").json["sid"]
+    assert len(backend) == 1
+    with client.session_transaction() as session:
+        assert session.sid == sid and session["booking_id"] == "TF-1"
@@ -0,0 +1,61 @@
+# ------------------------ tracing.py ------------------------
+# Per-request stage timings. A request calls start_trace(); code on the
+# request path wraps each stage in span("name"). Durations of the same stage
+# add up, and the trace is sent back as a Server-Timing header so browsers,
+# load tests and bench_pipeline.py can see where the time went.
+# Observers (metrics.py) see every span, traced request or not; with no
+# trace and no observers, span() only costs a ContextVar lookup.
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_trace = ContextVar("trace", default=None)
+_observers = []  # fn(stage, seconds), called for every span (metrics.py)
+
+
+def add_observer(fn):
+    _observers.append(fn)
+
+
+def start_trace() -> dict:
+    """Begin collecting spans for the current request; returns the stage -> seconds dict"""
+    trace = {}
+    _trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _trace.get()
+
+
+@contextmanager
+def span(name: str):
+    trace = _trace.get()
+    if trace is None and not _observers:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if trace is not None:
+            trace[name] = trace.get(name, 0.0) + elapsed
+        for observe in _observers:
+            observe(name, elapsed)
+
+
+def server_timing(trace: dict) -> str:
+    """Server-Timing header value, durations in ms"""
+    return ", ".join(f"{name};dur={seconds * 1e3:.2f}" for name, seconds in trace.items())
+
+
+def parse_server_timing(header: str) -> dict:
+    """Inverse of server_timing(): stage -> ms"""
+    stages = {}
+    for part in filter(None, (p.strip() for p in (header or "").split(","))):
+        name, _, dur = part.partition(";dur=")
+        if dur:
+            stages[name] = float(dur)
+    return stages